@@ -0,0 +1,137 @@
+# backfill.py
+"""
+Regenerates reflections for existing episodic memories, e.g. after reflection_prompt_template
+or the reflection schema changes.
+
+    python backfill.py --concurrency 16 --page-size 500
+
+Rows are read a page at a time in id order and reflected through the chain's async batch API
+with at most --concurrency calls in flight. Rate-limited calls are retried with exponential
+backoff; other failures are recorded and skipped. Each page is written back with one bulk
+upsert, and the last finished id is checkpointed so an interrupted run resumes where it stopped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from llm_cache import cached_json
+from near_duplicates import minhash
+from prompts import get_reflect, reflection_cache_namespace, REFLECTION_VERSION
+from storage import get_store
+
+def load_checkpoint(path: str) -> dict:
+    """
+    Returns the saved progress for the current reflection template, or a fresh one.
+    """
+    fresh = {"version": REFLECTION_VERSION, "last_id": 0, "updated": 0, "failed": []}
+    if not os.path.exists(path):
+        return fresh
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("version") != REFLECTION_VERSION:
+        print("Reflection template changed since the checkpoint was written; starting over.")
+        return fresh
+    return checkpoint
+
+def save_checkpoint(path: str, checkpoint: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+def is_rate_limit(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+async def reflect_batch(conversations: list, concurrency: int, max_retries: int = 6,
+                        base_delay: float = 2.0, max_delay: float = 60.0) -> list:
+    """
+    Reflects on each conversation with at most concurrency calls in flight. Rate-limited calls
+    are retried with exponential backoff and jitter; the result list holds a reflection dict or
+    the exception for each conversation.
+    """
+    chain = get_reflect()
+    results = [None] * len(conversations)
+    pending = list(range(len(conversations)))
+    for attempt in range(max_retries + 1):
+        outputs = await chain.abatch([{"conversation": conversations[i]} for i in pending],
+                                     config={"max_concurrency": concurrency}, return_exceptions=True)
+        retry = []
+        for i, output in zip(pending, outputs):
+            results[i] = output
+            if isinstance(output, Exception) and is_rate_limit(output):
+                retry.append(i)
+        if not retry or attempt == max_retries:
+            break
+        delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+        print(f"  {len(retry)} call(s) rate limited, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+        pending = retry
+    return results
+
+def backfill(page_size: int = 500, concurrency: int = 16, checkpoint_path: str = "./backfill_checkpoint.json",
+             limit: int = None, restart: bool = False) -> dict:
+    """
+    Regenerates reflections for every episodic memory after the checkpoint and writes them back.
+    Returns the final checkpoint.
+    """
+    return asyncio.run(backfill_async(page_size, concurrency, checkpoint_path, limit, restart))
+
+async def backfill_async(page_size: int, concurrency: int, checkpoint_path: str, limit: int, restart: bool) -> dict:
+    # One event loop for the whole run, so the async LLM client keeps its connection pool
+    checkpoint = {"version": REFLECTION_VERSION, "last_id": 0, "updated": 0, "failed": []} if restart \
+        else load_checkpoint(checkpoint_path)
+    if checkpoint["last_id"]:
+        print(f"Resuming after id {checkpoint['last_id']} ({checkpoint['updated']} already updated).")
+    namespace = reflection_cache_namespace()
+    start = time.perf_counter()
+    processed = 0
+    while limit is None or processed < limit:
+        count = page_size if limit is None else min(page_size, limit - processed)
+        rows = await asyncio.to_thread(get_store().page_episodic, checkpoint["last_id"], count, "id, conversation")
+        if not rows:
+            break
+
+        conversations = [row["conversation"] for row in rows]
+        reflections = await reflect_batch(conversations, concurrency)
+        updates = []
+        for row, reflection in zip(rows, reflections):
+            if isinstance(reflection, Exception):
+                print(f"  Reflection failed for memory {row['id']}: {reflection}")
+                checkpoint["failed"].append(row["id"])
+                continue
+            # Keep the response cache in step, so create_reflection reuses the new reflection
+            cached_json(namespace, row["conversation"], lambda text: reflection)
+            updates.append({
+                "id": row["id"],
+                "conversation": row["conversation"],
+                "context_tags": reflection["context_tags"],
+                "conversation_summary": reflection["conversation_summary"],
+                "what_worked": reflection["what_worked"],
+                "what_to_avoid": reflection["what_to_avoid"],
+                "summary_minhash": minhash(reflection["conversation_summary"]),
+            })
+        if updates:
+            await asyncio.to_thread(get_store().upsert_episodic, updates)
+
+        processed += len(rows)
+        checkpoint["last_id"] = rows[-1]["id"]
+        checkpoint["updated"] += len(updates)
+        save_checkpoint(checkpoint_path, checkpoint)
+        elapsed = time.perf_counter() - start
+        print(f"Through id {checkpoint['last_id']}: {processed} rows this run ({processed / elapsed:.1f} rows/sec)")
+
+    print(f"Backfill complete: {checkpoint['updated']} updated, {len(checkpoint['failed'])} failed.")
+    return checkpoint
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerate reflections for existing episodic memories.")
+    parser.add_argument("--page-size", type=int, default=500, help="rows read and written per round trip")
+    parser.add_argument("--concurrency", type=int, default=16, help="maximum reflection calls in flight")
+    parser.add_argument("--checkpoint", default="./backfill_checkpoint.json")
+    parser.add_argument("--limit", type=int, help="stop after this many rows")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first row")
+    args = parser.parse_args()
+    backfill(args.page_size, args.concurrency, args.checkpoint, args.limit, args.restart)
@@ -0,0 +1,372 @@
+# benchmark.py
+"""
+Offline benchmark for the memory pipeline.
+
+Replays scripted multi-turn sessions against an in-process fake Supabase (fakes.FakeSupabase)
+and a deterministic fake chat model (fakes.FakeChatModel), then reports p50/p95/p99 latency per
+stage, prompt tokens per turn and peak allocations per stage. With --check the results are
+compared against a stored baseline and the run exits non-zero on a regression.
+
+    python benchmark.py                        # run and print a report
+    python benchmark.py --save-baseline        # record bench_baseline.json
+    python benchmark.py --check                # fail if slower/larger than the baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "bench_baseline.json")
+
+DEFAULT_SESSIONS = [
+    [
+        "Hi, I want to lose about 5 kg before summer",
+        "How much protein should I eat per day?",
+        "What are good high protein breakfasts?",
+        "Is intermittent fasting useful for fat loss?",
+        "How many calories should I cut?",
+        "Can I still eat carbs at night?",
+        "What should I eat after a CrossFit workout?",
+        "How much water should I drink?",
+    ],
+    [
+        "I'm training for a half marathon, what should I eat the week before?",
+        "How do I carb load properly?",
+        "What about electrolytes on long runs?",
+        "Should I eat before an early morning run?",
+        "How much protein do I need for recovery?",
+        "What are good snacks for long training days?",
+    ],
+    [
+        "I'm vegetarian, can I still build muscle?",
+        "Which plant foods have the most protein?",
+        "Do I need protein powder?",
+        "How should I split my meals around training?",
+        "What about creatine?",
+        "Give me a sample day of eating",
+        "How do I track macros without an app?",
+        "What's a realistic rate of muscle gain?",
+        "Should I bulk or recomp?",
+        "How much fat should be in my diet?",
+    ],
+]
+
+VOCABULARY = (
+    "protein carbohydrate fat calories meal breakfast lunch dinner snack grams kilogram bodyweight "
+    "deficit surplus maintenance fiber vegetables fruit water hydration electrolytes sodium recovery "
+    "workout training crossfit strength endurance muscle glycogen insulin sleep fasting portion plate "
+    "lean chicken eggs yogurt oats rice beans lentils tofu nuts olive oil macros tracking habit"
+).split()
+
+def _setup_environment(workdir):
+    """
+    Point every local store at workdir, so the run never touches the developer's caches.
+    Clients are created lazily and replaced with fakes before use, so no credentials are needed.
+    """
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(workdir, "lexical_index.json")
+    os.environ["EMBEDDING_CACHE_DIR"] = os.path.join(workdir, "embedding_cache")
+    os.environ["LLM_CACHE_PATH"] = os.path.join(workdir, "llm_cache.sqlite")
+    os.environ["EPISODIC_SPOOL_PATH"] = os.path.join(workdir, "episodic_spool.jsonl")
+    shutil.copy(os.path.join(HERE, "procedural_memory.txt"), os.path.join(workdir, "procedural_memory.txt"))
+    os.chdir(workdir)
+    sys.path.insert(0, HERE)
+
+def _seed(fake_supabase, episodes: int, chunks: int, seed: int):
+    """
+    Fill the fake tables with synthetic episodic memories and nutrition chunks.
+    """
+    rng = random.Random(seed)
+    words = lambda n: " ".join(rng.choice(VOCABULARY) for _ in range(n))
+    fake_supabase.tables["episodic_memory"] = [
+        {
+            "id": i + 1,
+            "conversation": "\n".join(f"HUMAN: {words(12)}\nAI: {words(60)}" for _ in range(rng.randint(2, 10))),
+            "context_tags": [rng.choice(VOCABULARY) for _ in range(3)],
+            "conversation_summary": words(12),
+            "what_worked": f"{words(10)}. {words(8)}",
+            "what_to_avoid": f"{words(10)}. {words(8)}",
+            "created_at": f"2025-01-{1 + i % 28:02d}T00:00:00+00:00",
+        }
+        for i in range(episodes)
+    ]
+    fake_supabase.rpcs["match_episodic_memory"] = _match_episodic_memory
+    chunk_texts = [words(130) + "." for _ in range(chunks)]
+    fake_supabase.tables["crossfit_nutrition"] = [{"id": i + 1, "chunk": text} for i, text in enumerate(chunk_texts)]
+    # Rows inserted during the run are numbered after the seeded ones, as SERIAL would
+    fake_supabase._next_id.update(episodic_memory=episodes, crossfit_nutrition=chunks)
+    return chunk_texts
+
+def _match_episodic_memory(client, params):
+    """
+    Python stand-in for the match_episodic_memory RPC: rank by query terms found in the
+    summary and tags, newest first on ties.
+    """
+    from lexical_index import tokenize
+    terms = set(tokenize(params["query_text"]))
+    scored = []
+    for row in client.tables["episodic_memory"]:
+        text = f"{row['conversation_summary']} {' '.join(row['context_tags'])}".replace("_", " ")
+        score = len(terms & set(tokenize(text)))
+        if score:
+            scored.append((score, row["created_at"], row))
+    scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    columns = ("id", "conversation", "conversation_summary", "what_worked", "what_to_avoid", "created_at")
+    return [{c: row[c] for c in columns} for _, _, row in scored[:params.get("match_count", 3)]]
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+class Recorder:
+    def __init__(self, trace_allocations: bool):
+        self.trace_allocations = trace_allocations
+        self.latencies = {}
+        self.allocations = {}
+        self.prompt_tokens = []
+
+    def _record(self, stage, elapsed, peak):
+        self.latencies.setdefault(stage, []).append(elapsed)
+        if self.trace_allocations:
+            self.allocations.setdefault(stage, []).append(peak)
+
+    def measure(self, stage, fn, *args, **kwargs):
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - base if self.trace_allocations else 0
+        self._record(stage, elapsed, peak)
+        return result
+
+    async def ameasure(self, stage, coro):
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = await coro
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - base if self.trace_allocations else 0
+        self._record(stage, elapsed, peak)
+        return result
+
+class _PassThroughLLM:
+    """
+    Stands in for the response cache so every turn pays for a (fake) generation.
+    """
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    async def ainvoke(self, prompt, **_):
+        return await self.llm.ainvoke(prompt)
+
+def _forget_replayed_memories(seeded_episodes: int):
+    """
+    Deletes the episodic memories stored by a replay and drops the near-duplicate indexes, so
+    the next replay of the same sessions goes through reflection and insert again instead of
+    being skipped as a duplicate.
+    """
+    import memory_manager
+    from storage import get_store
+
+    store = get_store()
+    while True:
+        rows = store.page_episodic(seeded_episodes, 1000, "id")
+        if not rows:
+            break
+        store.delete_episodic([row["id"] for row in rows])
+    memory_manager._duplicate_indexes = None
+
+async def _replay(sessions, recorder, fake_llm, seeded_episodes: int, repeat: int = 1):
+    for _ in range(repeat):
+        _forget_replayed_memories(seeded_episodes)
+        await _replay_sessions(sessions, recorder)
+    return fake_llm.calls
+
+async def _replay_sessions(sessions, recorder):
+    import memory_manager
+    import trainer
+    from context_budget import count_tokens
+    from history import ConversationHistory
+    from langchain_core.messages import HumanMessage
+
+    for questions in sessions:
+        conversations, what_worked, what_to_avoid = [], set(), set()
+        history = ConversationHistory(keep_turns=trainer.HISTORY_KEEP_TURNS)
+        system_prompt = None
+        for question in questions:
+            # The two recall stages on their own, as called by the synchronous helpers
+            recorder.measure("episodic_system_prompt", memory_manager.episodic_system_prompt,
+                             question, list(conversations), set(what_worked), set(what_to_avoid))
+            recorder.measure("semantic_rag", memory_manager.semantic_rag, question)
+
+            # A full trainer turn: concurrent recall, budgeted prompt assembly and generation
+            turn_start = time.perf_counter()
+            system_prompt, context_message, prompt_history = await recorder.ameasure(
+                "gather_turn_context",
+                trainer.gather_turn_context(question, history.prompt_messages(), conversations,
+                                            what_worked, what_to_avoid),
+            )
+            user_message = HumanMessage(content=question)
+            prompt = [system_prompt] + prompt_history + [context_message, user_message]
+            recorder.prompt_tokens.append(sum(count_tokens(str(msg.content)) for msg in prompt))
+            response = await recorder.ameasure("llm.invoke", trainer.get_cached_llm().ainvoke(prompt, query=question))
+            history.add_turn(user_message, response)
+            recorder._record("turn", time.perf_counter() - turn_start, 0)
+        await history.wait()
+
+        messages = [system_prompt] + history.transcript
+        recorder.measure("add_episodic_memory", memory_manager.add_episodic_memory, messages)
+        recorder.measure("procedural_memory_update", memory_manager.procedural_memory_update, what_worked, what_to_avoid)
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="form-bench-")
+    cwd = os.getcwd()
+    try:
+        _setup_environment(workdir)
+        import config
+        import memory_manager
+        import prompts
+        import trainer
+        from fakes import FakeSupabase, FakeChatModel
+
+        fake_supabase = FakeSupabase(latency=args.db_latency / 1000, jitter=args.db_jitter / 1000, seed=args.seed)
+        fake_llm = FakeChatModel(first_token_latency=args.llm_latency / 1000,
+                                 token_latency=args.token_latency / 1000,
+                                 output_tokens=args.output_tokens)
+        chunk_texts = _seed(fake_supabase, args.episodes, args.chunks, args.seed)
+        if args.backend == "sqlite":
+            # Same seeded rows in a local SQLite store; recall then runs on its FTS5 indexes
+            import storage
+            store = storage.SQLiteStore(os.path.join(workdir, "memory.sqlite"))
+            store.upsert_episodic(fake_supabase.tables["episodic_memory"])
+            store.upsert_chunks([dict(row, chunk_hash=str(row["id"])) for row in fake_supabase.tables["crossfit_nutrition"]])
+            storage.set_store(store)
+
+        # The reflection and summary chains are built lazily, so they pick up the fake LLM too
+        config.set_clients(llm=fake_llm, supabase=fake_supabase)
+        if not args.with_llm_cache:
+            prompts.cached_json = lambda namespace, text, compute: compute(text)
+            trainer.get_cached_llm = lambda: _PassThroughLLM(fake_llm)
+        if not args.no_index:
+            memory_manager.build_lexical_index(chunk_texts)
+
+        sessions = DEFAULT_SESSIONS
+        if args.sessions:
+            with open(os.path.join(cwd, args.sessions)) as f:
+                sessions = json.load(f)
+
+        latency = Recorder(trace_allocations=False)
+        asyncio.run(_replay(sessions, latency, fake_llm, args.episodes, args.repeat))
+        # Allocations are traced in a separate single pass so tracing doesn't skew the latencies
+        tracemalloc.start()
+        allocations = Recorder(trace_allocations=True)
+        asyncio.run(_replay(sessions, allocations, fake_llm, args.episodes))
+        tracemalloc.stop()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {"stages": {}, "prompt_tokens": {}}
+    for stage, values in latency.latencies.items():
+        peaks = allocations.allocations.get(stage, [0])
+        results["stages"][stage] = {
+            "n": len(values),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "peak_alloc_kib": sum(peaks) / len(peaks) / 1024,
+        }
+    tokens = latency.prompt_tokens
+    results["prompt_tokens"] = {"mean": sum(tokens) / len(tokens), "max": max(tokens), "last": tokens[-1]}
+    results["semantic_selection"] = memory_manager.semantic_selection_stats()
+    return results
+
+def print_report(results):
+    print(f"{'stage':<26}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak KiB':>11}")
+    for stage, r in results["stages"].items():
+        print(f"{stage:<26}{r['n']:>6}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['peak_alloc_kib']:>11.1f}")
+    t = results["prompt_tokens"]
+    print(f"\nPrompt tokens per turn: mean {t['mean']:.0f}, max {t['max']}, last {t['last']}")
+    selection = results.get("semantic_selection")
+    if selection:
+        print(f"Semantic chunks per turn: {selection['chunks_per_recall']:.1f} sent, "
+              f"{selection['chunks_dropped_per_recall']:.1f} of the top k dropped, "
+              f"{selection['chunks_promoted_per_recall']:.1f} promoted from beyond k")
+        print(f"Semantic context tokens per turn: {selection['tokens_removed_per_recall']:.0f} removed, "
+              f"{selection['tokens_added_per_recall']:.0f} added, net {selection['tokens_saved_per_recall']:.0f} saved")
+
+def compare(results, baseline, tolerance: float, slack_ms: float) -> list:
+    """
+    Returns a list of regressions: p95 latency, peak allocations or prompt tokens more than
+    tolerance above the baseline (latency also gets slack_ms of absolute headroom for noise).
+    """
+    regressions = []
+    for stage, base in baseline["stages"].items():
+        current = results["stages"].get(stage)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance) + slack_ms:
+            regressions.append(f"{stage}: p95 {current['p95_ms']:.2f} ms vs baseline {base['p95_ms']:.2f} ms")
+        if current["peak_alloc_kib"] > base["peak_alloc_kib"] * (1 + tolerance) + 64:
+            regressions.append(f"{stage}: peak alloc {current['peak_alloc_kib']:.0f} KiB vs baseline {base['peak_alloc_kib']:.0f} KiB")
+    base_tokens = baseline["prompt_tokens"]["mean"]
+    if results["prompt_tokens"]["mean"] > base_tokens * (1 + tolerance):
+        regressions.append(f"prompt tokens: mean {results['prompt_tokens']['mean']:.0f} vs baseline {base_tokens:.0f}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the memory pipeline.")
+    parser.add_argument("--sessions", help="JSON file with a list of sessions, each a list of user messages")
+    parser.add_argument("--repeat", type=int, default=5, help="times to replay the sessions")
+    parser.add_argument("--episodes", type=int, default=500, help="seeded episodic_memory rows")
+    parser.add_argument("--chunks", type=int, default=1000, help="seeded crossfit_nutrition rows")
+    parser.add_argument("--db-latency", type=float, default=20.0, help="fake Supabase latency per request (ms)")
+    parser.add_argument("--db-jitter", type=float, default=5.0, help="extra random Supabase latency (ms)")
+    parser.add_argument("--llm-latency", type=float, default=300.0, help="fake LLM time to first token (ms)")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="fake LLM time per output token (ms)")
+    parser.add_argument("--output-tokens", type=int, default=150)
+    parser.add_argument("--backend", choices=("supabase", "sqlite"), default="supabase",
+                        help="storage backend: the fake Supabase client or a local SQLite file")
+    parser.add_argument("--no-index", action="store_true", help="skip the BM25 index and use the table search")
+    parser.add_argument("--with-llm-cache", action="store_true", help="keep the response/reflection cache enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 on regression against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--slack-ms", type=float, default=2.0, help="allowed absolute latency regression")
+    args = parser.parse_args()
+    if args.check and not args.save_baseline and not os.path.exists(args.baseline):
+        parser.error(f"no baseline at {args.baseline}; record one first with --save-baseline")
+
+    results = run(args)
+    print_report(results)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    if args.check:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.slack_ms)
+        if regressions:
+            print("\nREGRESSIONS:")
+            for line in regressions:
+                print(" -", line)
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
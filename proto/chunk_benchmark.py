@@ -0,0 +1,88 @@
+# chunk_benchmark.py
+"""
+Compares the token-aware chunker with RecursiveTokenChunker on a PDF (the bundled nutrition
+book by default): chunks/sec, and the spread of chunk sizes in model tokens.
+
+    python chunk_benchmark.py --chunk-tokens 200 --repeat 5
+
+PDF parsing is done once up front and excluded from the timings. The recursive chunker runs
+twice: as load_pdf_chunks configures it (800 characters, length_function=len) and with the
+same token budget as the token chunker, measured with count_tokens.
+"""
+import argparse
+import os
+import statistics
+import time
+
+from context_budget import count_tokens
+from token_chunker import split_text_by_tokens
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PDF = os.path.join(HERE, "21-Day-Fat-Loss-Nutrition-Program-Book.pdf")
+SEPARATORS = ["\n\n", "\n", ".", "?", "!", " ", ""]
+
+def load_document(pdf_path: str) -> str:
+    from langchain_community.document_loaders import PyPDFLoader
+    # Pages are joined with a single space, matching load_pdf_chunks
+    return " ".join(page.page_content for page in PyPDFLoader(pdf_path).lazy_load())
+
+def time_chunker(split, document: str, repeat: int) -> tuple:
+    """
+    Runs split(document) repeat times; returns (best seconds, chunks from the last run).
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = split(document)
+        best = min(best, time.perf_counter() - start)
+    return best, chunks
+
+def size_stats(chunks: list, budget: int) -> dict:
+    sizes = [count_tokens(chunk) for chunk in chunks]
+    mean = statistics.mean(sizes)
+    stdev = statistics.pstdev(sizes)
+    return {
+        "mean": mean,
+        "stdev": stdev,
+        "cv": stdev / mean if mean else 0.0,
+        "min": min(sizes),
+        "max": max(sizes),
+        "over_budget": sum(size > budget for size in sizes),
+    }
+
+def run(pdf_path: str, chunk_tokens: int, overlap_tokens: int, repeat: int) -> dict:
+    from chunking_evaluation.chunking import RecursiveTokenChunker
+
+    document = load_document(pdf_path)
+    print(f"{os.path.basename(pdf_path)}: {len(document)} characters, {count_tokens(document)} tokens\n")
+    chunkers = {
+        "recursive (800 chars)": RecursiveTokenChunker(
+            chunk_size=800, chunk_overlap=0, length_function=len, separators=SEPARATORS
+        ).split_text,
+        f"recursive ({chunk_tokens} tokens)": RecursiveTokenChunker(
+            chunk_size=chunk_tokens, chunk_overlap=overlap_tokens, length_function=count_tokens, separators=SEPARATORS
+        ).split_text,
+        f"token ({chunk_tokens} tokens)": lambda text: split_text_by_tokens(text, chunk_tokens, overlap_tokens),
+    }
+    results = {}
+    for name, split in chunkers.items():
+        seconds, chunks = time_chunker(split, document, repeat)
+        results[name] = dict(size_stats(chunks, chunk_tokens), chunks=len(chunks), seconds=seconds,
+                             chunks_per_sec=len(chunks) / seconds if seconds else 0.0)
+    return results
+
+def print_report(results: dict, chunk_tokens: int):
+    print(f"{'chunker':<26}{'chunks':>8}{'ms':>10}{'chunks/s':>11}{'mean tok':>10}{'stdev':>8}{'cv':>7}"
+          f"{'min':>6}{'max':>6}{f'>{chunk_tokens}':>7}")
+    for name, r in results.items():
+        print(f"{name:<26}{r['chunks']:>8}{r['seconds'] * 1000:>10.1f}{r['chunks_per_sec']:>11.0f}{r['mean']:>10.1f}"
+              f"{r['stdev']:>8.1f}{r['cv']:>7.2f}{r['min']:>6}{r['max']:>6}{r['over_budget']:>7}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the token-aware chunker against RecursiveTokenChunker.")
+    parser.add_argument("pdf", nargs="?", default=DEFAULT_PDF)
+    parser.add_argument("--chunk-tokens", type=int, default=200)
+    parser.add_argument("--overlap-tokens", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per chunker; the best time is reported")
+    args = parser.parse_args()
+    print_report(run(args.pdf, args.chunk_tokens, args.overlap_tokens, args.repeat), args.chunk_tokens)
@@ -0,0 +1,137 @@
+# chunk_selection.py
+"""
+Post-retrieval selection of semantic memory chunks.
+
+Retrieval (BM25, table text search or vector search) returns a ranked candidate list. Before
+the chunks reach the prompt, select_chunks:
+
+  1. drops candidates scoring below min_score_ratio of the best candidate, so k shrinks on
+     turns where only a few chunks are relevant;
+  2. drops candidates whose word shingles mostly overlap a chunk already selected (chunks cut
+     with overlap, or the same passage from two documents);
+  3. orders the rest by maximal marginal relevance, trading relevance against similarity to
+     what has already been picked, and keeps at most k.
+
+Redundancy is measured on word 3-shingles (as in near_duplicates.py) rather than embeddings,
+so the same stage works for every retrieval path without an extra embedding call. Shingle
+hashes are cached per chunk text, so a chunk that keeps coming back is hashed once, and the
+pairwise overlaps of a recall's candidates come from a single matrix product.
+"""
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from context_budget import count_tokens
+from near_duplicates import shingles
+
+@lru_cache(maxsize=8192)
+def _shingle_hashes(chunk: str) -> np.ndarray:
+    hashes = shingles(chunk)
+    hashes.flags.writeable = False
+    return hashes
+
+def _overlaps(chunks: list) -> tuple:
+    """
+    Pairwise Jaccard similarity and containment (shared shingles over the smaller set) of
+    the chunks' shingle sets, from one product of their shingle incidence matrix.
+    """
+    grams = [_shingle_hashes(chunk) for chunk in chunks]
+    ids = np.unique(np.concatenate(grams), return_inverse=True)[1]
+    incidence = np.zeros((len(chunks), ids.max() + 1 if ids.size else 0), dtype=np.float32)
+    incidence[np.repeat(np.arange(len(chunks)), [len(g) for g in grams]), ids] = 1.0
+    shared = incidence @ incidence.T
+    sizes = np.diag(shared)
+    union = sizes[:, None] + sizes[None, :] - shared
+    smaller = np.minimum(sizes[:, None], sizes[None, :])
+    jaccard = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+    containment = np.divide(shared, smaller, out=np.zeros_like(shared), where=smaller > 0)
+    return jaccard, containment
+
+def _relevance(count: int, scores: list = None) -> list:
+    """
+    Relevance in [0, 1], relative to the best candidate. Without scores (e.g. table text
+    search) it falls off linearly with rank.
+    """
+    if not scores or max(scores) <= 0:
+        return [1.0 - i / count for i in range(count)]
+    top = max(scores)
+    return [max(score, 0.0) / top for score in scores]
+
+def select_chunks(chunks: list, scores: list = None, k: int = 15, min_score_ratio: float = 0.0,
+                  dedup_threshold: float = 0.6, mmr_lambda: float = 0.7) -> list:
+    """
+    Picks up to k of the ranked candidate chunks. Returns the indexes of the chosen chunks in
+    selection order (most useful first).
+    """
+    if not chunks or k <= 0:
+        return []
+    relevance = np.asarray(_relevance(len(chunks), scores))
+    candidates = np.flatnonzero(relevance >= min_score_ratio)
+    if not candidates.size:
+        return []
+    jaccard, containment = _overlaps([chunks[i] for i in candidates])
+    relevance = relevance[candidates]
+    redundancy = np.zeros(len(candidates))   # max Jaccard similarity to any selected chunk
+    alive = np.ones(len(candidates), dtype=bool)
+
+    selected = []
+    while alive.any() and len(selected) < k:
+        best = int(np.argmax(np.where(alive, mmr_lambda * relevance - (1 - mmr_lambda) * redundancy, -np.inf)))
+        selected.append(int(candidates[best]))
+        alive[best] = False
+        # Containment catches a short chunk that is a slice of a longer one
+        alive &= containment[best] < dedup_threshold
+        redundancy = np.maximum(redundancy, jaccard[best])
+    return selected
+
+class SelectionStats:
+    """
+    Running totals of what selection changed against sending the first k raw candidates:
+    chunks and context tokens of those k that were dropped, and of candidates from beyond k
+    that MMR promoted in their place. The two are kept apart because a promoted chunk can be
+    longer than the ones it replaced, so the net change alone can hide what was removed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.chunks_before = self.chunks_after = 0
+        self.chunks_removed = self.chunks_added = 0
+        self.tokens_removed = self.tokens_added = 0
+
+    def record(self, before: list, after: list) -> tuple:
+        """
+        Records one recall; before is what would have been sent without selection. Returns the
+        context tokens (removed, added). Only the chunks that differ are tokenized.
+        """
+        kept = set(after)
+        removed = [chunk for chunk in before if chunk not in kept]
+        original = set(before)
+        added = [chunk for chunk in after if chunk not in original]
+        tokens_removed = sum(count_tokens(chunk) for chunk in removed)
+        tokens_added = sum(count_tokens(chunk) for chunk in added)
+        with self._lock:
+            self.turns += 1
+            self.chunks_before += len(before)
+            self.chunks_after += len(after)
+            self.chunks_removed += len(removed)
+            self.chunks_added += len(added)
+            self.tokens_removed += tokens_removed
+            self.tokens_added += tokens_added
+        return tokens_removed, tokens_added
+
+    def stats(self) -> dict:
+        turns = self.turns or 1
+        saved = self.tokens_removed - self.tokens_added
+        return {
+            "recalls": self.turns,
+            "chunks_per_recall": self.chunks_after / turns,
+            "chunks_dropped_per_recall": self.chunks_removed / turns,
+            "chunks_promoted_per_recall": self.chunks_added / turns,
+            "tokens_removed_per_recall": self.tokens_removed / turns,
+            "tokens_added_per_recall": self.tokens_added / turns,
+            "tokens_saved_per_recall": saved / turns,
+        }
+
+selection_stats = SelectionStats()
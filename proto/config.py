@@ -1,15 +1,138 @@
 # config.py
+"""
+Settings are read from the environment at import; clients are built on first use by the
+get_* factories below, so importing config is cheap and works without credentials.
+"""
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from supabase import create_client, Client
 import os
+import threading
 
 load_dotenv()
 
-# Initialize the LLM with desired parameters
-llm = ChatOpenAI(temperature=0.7, model="gpt-4o")
+# Embedding model used for chunk and query vectors
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
 
-# Initialize Supabase client
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
\ No newline at end of file
+
+_llm = None
+_embeddings = None
+_supabase = None
+_client_lock = threading.Lock()
+
+def get_llm():
+    """
+    Returns the shared chat model, creating it on first use.
+    """
+    global _llm
+    if _llm is None:
+        with _client_lock:
+            if _llm is None:
+                from langchain_openai import ChatOpenAI
+                _llm = ChatOpenAI(temperature=0.7, model="gpt-4o")
+    return _llm
+
+def get_embeddings():
+    """
+    Returns the shared embedding model, creating it on first use.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _client_lock:
+            if _embeddings is None:
+                from langchain_openai import OpenAIEmbeddings
+                _embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+    return _embeddings
+
+def get_supabase():
+    """
+    Returns the shared Supabase client, connecting on first use.
+    """
+    global _supabase
+    if _supabase is None:
+        with _client_lock:
+            if _supabase is None:
+                from supabase import create_client
+                _supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase
+
+def set_clients(llm=None, embeddings=None, supabase=None):
+    """
+    Replaces the shared clients (e.g. with the fakes in fakes.py); None leaves one unchanged.
+    """
+    global _llm, _embeddings, _supabase
+    with _client_lock:
+        _llm = llm or _llm
+        _embeddings = embeddings or _embeddings
+        _supabase = supabase or _supabase
+
+_FACTORIES = {"llm": get_llm, "embeddings": get_embeddings, "supabase": get_supabase}
+
+def __getattr__(name):
+    # Keeps `config.llm` / `from config import supabase` working for older scripts and notebooks
+    if name in _FACTORIES:
+        return _FACTORIES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Local BM25 index over the semantic memory chunks
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "./lexical_index.json")
+
+# Local quantized vector index over chunk embeddings (see vector_index.py); used for vector search once built
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "./vector_index")
+
+# Per-page and per-chunk hashes from the last incremental ingest (see reingest.py)
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "./ingest_manifest.json")
+
+# On-disk embedding cache (see embedding_cache.py)
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Per-turn retrieval timeouts in seconds; a retrieval that misses its deadline is skipped for that turn
+EPISODIC_TIMEOUT = float(os.getenv("EPISODIC_TIMEOUT", "2.0"))
+SEMANTIC_TIMEOUT = float(os.getenv("SEMANTIC_TIMEOUT", "2.0"))
+
+# Append-only spool for finished sessions awaiting reflection and storage
+EPISODIC_SPOOL_PATH = os.getenv("EPISODIC_SPOOL_PATH", "./episodic_spool.jsonl")
+# Seconds the CLI waits at exit for queued sessions to be stored before leaving them in the spool
+EPISODIC_CLOSE_TIMEOUT = float(os.getenv("EPISODIC_CLOSE_TIMEOUT", "15.0"))
+
+# Per-turn prompt budget in tokens; the system prompt and semantic chunks are capped, history gets the rest
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+SYSTEM_PROMPT_MAX_TOKENS = int(os.getenv("SYSTEM_PROMPT_MAX_TOKENS", "2000"))
+SEMANTIC_MAX_TOKENS = int(os.getenv("SEMANTIC_MAX_TOKENS", "3000"))
+
+# Post-retrieval chunk selection (see chunk_selection.py). Chunks scoring below the ratio of the best
+# candidate are dropped (BM25 scores and cosine similarities need different ratios), then overlapping
+# chunks are removed and the rest ordered by maximal marginal relevance
+SEMANTIC_MIN_SCORE_RATIO = float(os.getenv("SEMANTIC_MIN_SCORE_RATIO", "0.3"))
+VECTOR_MIN_SCORE_RATIO = float(os.getenv("VECTOR_MIN_SCORE_RATIO", "0.8"))
+SEMANTIC_DEDUP_THRESHOLD = float(os.getenv("SEMANTIC_DEDUP_THRESHOLD", "0.6"))
+SEMANTIC_MMR_LAMBDA = float(os.getenv("SEMANTIC_MMR_LAMBDA", "0.7"))
+SEMANTIC_CANDIDATE_FACTOR = int(os.getenv("SEMANTIC_CANDIDATE_FACTOR", "2"))
+
+# Turns of conversation kept verbatim in the prompt; older turns are folded into a running summary
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+
+# The session's episodic reflection is updated in the background every this many turns
+REFLECT_EVERY_TURNS = int(os.getenv("REFLECT_EVERY_TURNS", "4"))
+
+# Local LLM response cache (see llm_cache.py); set LLM_CACHE_SEMANTIC_THRESHOLD (e.g. 0.95) to enable the similarity tier
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.sqlite")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_SEMANTIC_THRESHOLD = float(os.environ["LLM_CACHE_SEMANTIC_THRESHOLD"]) if os.getenv("LLM_CACHE_SEMANTIC_THRESHOLD") else None
+
+# Near-duplicate episodic memories: MinHash similarity threshold and how many recent memories to compare against
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+DEDUP_RECENT = int(os.getenv("DEDUP_RECENT", "2000"))
+
+# Chat service (see server.py): session store bounds, outbound LLM concurrency and recall thread pool size
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "32"))
+RECALL_WORKERS = int(os.getenv("RECALL_WORKERS", "64"))
+
+# Storage backend for episodic and semantic memory (see storage.py): "supabase" or "sqlite"
+MEMORY_BACKEND = os.getenv("MEMORY_BACKEND", "supabase").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "./memory.sqlite")
@@ -0,0 +1,212 @@
+# consolidate.py
+import argparse
+
+import numpy as np
+
+from config import get_supabase
+from embedding_cache import embed_texts
+from near_duplicates import minhash
+from prompts import get_reflect
+from storage import get_store
+
+TEXT_COLUMNS = ("conversation", "conversation_summary", "what_worked", "what_to_avoid")
+# Random-hyperplane LSH over summary embeddings. Two unit vectors at cosine c fall on the same
+# side of a random hyperplane with probability 1 - arccos(c) / pi, so with 32 bands of 12 bits
+# a pair at cosine 0.85 shares a band about 96% of the time and an unrelated pair about 1%
+CANDIDATE_BANDS = 32
+CANDIDATE_BITS = 12
+
+def fetch_memories(page_size: int = 1000) -> list:
+    """
+    Pages through the whole episodic_memory table in id order.
+    """
+    rows = []
+    last_id = 0
+    while True:
+        page = get_store().page_episodic(
+            last_id, page_size, "id, conversation, context_tags, conversation_summary, what_worked, what_to_avoid, created_at"
+        )
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        last_id = page[-1]["id"]
+
+def embedding_buckets(vectors: np.ndarray, bands: int = CANDIDATE_BANDS, bits: int = CANDIDATE_BITS,
+                      seed: int = 0, block_rows: int = 4096) -> list:
+    """
+    Groups rows whose embeddings agree on every bit of at least one LSH band. Returns arrays
+    of row indexes, one per bucket of two or more rows.
+    """
+    rng = np.random.default_rng(seed)
+    planes = rng.standard_normal((vectors.shape[1], bands * bits)).astype(np.float32)
+    weights = 1 << np.arange(bits, dtype=np.int64)
+    keys = np.empty((len(vectors), bands), dtype=np.int64)
+    for start in range(0, len(vectors), block_rows):
+        signs = (vectors[start:start + block_rows] @ planes > 0).reshape(-1, bands, bits)
+        keys[start:start + block_rows] = signs @ weights
+    buckets = []
+    for band in range(bands):
+        order = np.argsort(keys[:, band], kind="stable")
+        edges = np.flatnonzero(np.diff(keys[order, band])) + 1
+        buckets.extend(members for members in np.split(order, edges) if len(members) > 1)
+    return buckets
+
+def cluster_memories(rows: list, tag_threshold: float = 0.3, similarity_threshold: float = 0.85) -> list:
+    """
+    Groups memories that share context tags (Jaccard >= tag_threshold) and have similar
+    summaries (embedding cosine >= similarity_threshold). Candidate pairs come from LSH over
+    the summary embeddings (see embedding_buckets), so the work grows with the number of
+    similar pairs rather than quadratically; each bucket's cosines are checked as one matrix
+    product, and only pairs sharing at least one tag count. Returns clusters of two or more
+    row indexes.
+    """
+    if len(rows) < 2:
+        return []
+    vectors = np.asarray(embed_texts([row["conversation_summary"] or "" for row in rows]), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    tags = [set(row["context_tags"] or []) for row in rows]
+
+    parent = list(range(len(rows)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for members in embedding_buckets(vectors):
+        # Pairs already joined (most of them, once a cluster has been seen in an earlier band) are skipped
+        roots = np.array([find(i) for i in members])
+        if (roots == roots[0]).all():
+            continue
+        similar = np.triu(vectors[members] @ vectors[members].T >= similarity_threshold, 1)
+        similar &= roots[:, None] != roots[None, :]
+        for a, b in zip(*np.nonzero(similar)):
+            i, j = int(members[a]), int(members[b])
+            if find(i) == find(j):
+                continue
+            shared = tags[i] & tags[j]
+            if shared and len(shared) / len(tags[i] | tags[j]) >= tag_threshold:
+                parent[find(i)] = find(j)
+
+    clusters = {}
+    for i in range(len(rows)):
+        clusters.setdefault(find(i), []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+def cluster_digest(members: list) -> str:
+    """
+    Compact text describing a cluster of memories, used both as the reflection input and as
+    the consolidated row's conversation.
+    """
+    lines = [f"Consolidated from {len(members)} sessions:"]
+    for row in members:
+        lines.append(f"- {row['conversation_summary']} | worked: {row['what_worked']} | avoid: {row['what_to_avoid']}")
+    return "\n".join(lines)
+
+def row_bytes(row: dict) -> int:
+    return sum(len((row.get(col) or "").encode("utf-8")) for col in TEXT_COLUMNS) + \
+        sum(len(tag.encode("utf-8")) for tag in row.get("context_tags") or [])
+
+def consolidate(tag_threshold: float = 0.3, similarity_threshold: float = 0.85, archive: bool = True,
+                max_concurrency: int = 8, dry_run: bool = False) -> dict:
+    """
+    Clusters related episodic memories, replaces each cluster with one consolidated memory
+    (one reflection call per cluster, run through the chain's batch API), and archives or
+    deletes the originals. Returns a summary of rows and bytes reclaimed.
+    """
+    rows = fetch_memories()
+    clusters = cluster_memories(rows, tag_threshold, similarity_threshold)
+    groups = [[rows[i] for i in members] for members in clusters]
+    print(f"{len(rows)} memories, {len(groups)} clusters covering {sum(len(g) for g in groups)} rows.")
+    if not groups or dry_run:
+        return {"clusters": len(groups), "rows_reclaimed": 0, "bytes_reclaimed": 0}
+
+    digests = [cluster_digest(group) for group in groups]
+    reflections = get_reflect().batch([{"conversation": digest} for digest in digests],
+                                      config={"max_concurrency": max_concurrency}, return_exceptions=True)
+
+    rows_reclaimed = bytes_reclaimed = 0
+    for group, digest, reflection in zip(groups, digests, reflections):
+        if isinstance(reflection, Exception):
+            print(f"Skipping cluster of {len(group)} (reflection failed: {reflection})")
+            continue
+        tags = list(dict.fromkeys(tag for row in group for tag in (row["context_tags"] or [])))
+        consolidated = {
+            "conversation": digest,
+            "context_tags": list(dict.fromkeys(reflection.get("context_tags", []) + tags)),
+            "conversation_summary": reflection["conversation_summary"],
+            "what_worked": reflection["what_worked"],
+            "what_to_avoid": reflection["what_to_avoid"],
+            "created_at": max(row["created_at"] for row in group),
+            "transcript_minhash": minhash(digest),
+            "summary_minhash": minhash(reflection["conversation_summary"]),
+        }
+        # Insert, archive and delete happen in one transaction
+        inserted = get_store().replace_episodic(consolidated, [row["id"] for row in group], archive)
+        if not inserted:
+            print("Error inserting consolidated memory.")
+            continue
+        rows_reclaimed += len(group) - 1
+        bytes_reclaimed += sum(row_bytes(row) for row in group) - row_bytes(consolidated)
+
+    print(f"Reclaimed {rows_reclaimed} rows and {bytes_reclaimed / 1024:.1f} KiB from episodic_memory.")
+    return {"clusters": len(groups), "rows_reclaimed": rows_reclaimed, "bytes_reclaimed": bytes_reclaimed}
+
+def ensure_archive_table_exists():
+    """
+    Creates the episodic_memory_archive table that consolidated originals are moved to, and
+    the consolidate_episodic_memory RPC that swaps a cluster for its consolidated row in one
+    transaction. Supabase only; the SQLite backend creates the table with the rest of its schema.
+    """
+    sql = """
+    CREATE TABLE IF NOT EXISTS episodic_memory_archive (
+        id INTEGER PRIMARY KEY,
+        conversation TEXT NOT NULL,
+        context_tags TEXT[] NOT NULL,
+        conversation_summary TEXT,
+        what_worked TEXT,
+        what_to_avoid TEXT,
+        created_at TIMESTAMPTZ,
+        consolidated_into INTEGER,
+        archived_at TIMESTAMPTZ DEFAULT NOW()
+    );
+
+    CREATE OR REPLACE FUNCTION consolidate_episodic_memory(new_row JSONB, old_ids INT[], archive BOOLEAN)
+    RETURNS SETOF episodic_memory LANGUAGE plpgsql AS $$
+    DECLARE
+        inserted episodic_memory;
+    BEGIN
+        INSERT INTO episodic_memory (conversation, context_tags, conversation_summary, what_worked,
+                                     what_to_avoid, created_at, transcript_minhash, summary_minhash)
+        SELECT r.conversation, r.context_tags, r.conversation_summary, r.what_worked,
+               r.what_to_avoid, r.created_at, r.transcript_minhash, r.summary_minhash
+        FROM jsonb_populate_record(NULL::episodic_memory, new_row) r
+        RETURNING * INTO inserted;
+        IF archive THEN
+            INSERT INTO episodic_memory_archive (id, conversation, context_tags, conversation_summary,
+                                                 what_worked, what_to_avoid, created_at, consolidated_into)
+            SELECT id, conversation, context_tags, conversation_summary, what_worked, what_to_avoid,
+                   created_at, inserted.id
+            FROM episodic_memory WHERE id = ANY(old_ids)
+            ON CONFLICT (id) DO NOTHING;
+        END IF;
+        DELETE FROM episodic_memory WHERE id = ANY(old_ids);
+        RETURN NEXT inserted;
+    END;
+    $$;
+    """
+    response = get_supabase().rpc("sql", {"sql": sql}).execute()
+    print("Table check complete. Episodic memory archive table is ready.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge related episodic memories into consolidated ones.")
+    parser.add_argument("--tag-threshold", type=float, default=0.3, help="minimum context_tags Jaccard")
+    parser.add_argument("--similarity-threshold", type=float, default=0.85, help="minimum summary cosine similarity")
+    parser.add_argument("--delete", action="store_true", help="delete originals instead of archiving them")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--dry-run", action="store_true", help="only report the clusters that would be merged")
+    args = parser.parse_args()
+    if not args.dry_run and get_store().name == "supabase":
+        ensure_archive_table_exists()
+    consolidate(args.tag_threshold, args.similarity_threshold, archive=not args.delete,
+                max_concurrency=args.max_concurrency, dry_run=args.dry_run)
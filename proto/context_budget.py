@@ -0,0 +1,100 @@
+# context_budget.py
+import logging
+from functools import lru_cache
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """
+    The tiktoken encoding for model (o200k_base if tiktoken doesn't know it), cached per model.
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """
+    Counts the tokens text will use for the given model.
+    """
+    return len(get_encoding(model).encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o") -> str:
+    """
+    Cuts text down to at most max_tokens tokens, marking the cut with an ellipsis.
+    """
+    if max_tokens <= 0:
+        return ""
+    tokens = get_encoding(model).encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return get_encoding(model).decode(tokens[:max(max_tokens - 1, 0)]) + "…"
+
+def allocate_budget(total: int, sections: list) -> dict:
+    """
+    Splits a token budget across sections given as (name, tokens_needed, cap) in priority order.
+    Each section gets what it needs, limited by its cap (None for no cap) and by what higher
+    priority sections have left over.
+    """
+    allowances = {}
+    remaining = max(total, 0)
+    for name, needed, cap in sections:
+        allowance = min(needed, remaining, cap if cap is not None else needed)
+        allowances[name] = allowance
+        remaining -= allowance
+    return allowances
+
+def take_within_budget(parts: list, budget: int, from_end: bool = False, count=count_tokens) -> list:
+    """
+    Keeps whole parts, in order (or newest-first when from_end is set), until the next one
+    would exceed the budget. Returns the kept parts in their original order.
+    """
+    kept = []
+    used = 0
+    for part in (reversed(parts) if from_end else parts):
+        tokens = count(part)
+        if used + tokens > budget:
+            break
+        kept.append(part)
+        used += tokens
+    return list(reversed(kept)) if from_end else kept
+
+def take_history_within_budget(messages: list, budget: int, model: str = "gpt-4o") -> list:
+    """
+    Fits prompt history to budget without splitting a turn. Leading system messages (the
+    running summary of earlier turns) are reserved first, cut down if they alone overflow;
+    the rest of the budget goes to the most recent whole turns, each a human message and the
+    replies after it, so an AI reply is never sent without the question it answers.
+    """
+    start = 0
+    while start < len(messages) and messages[start].type == "system":
+        start += 1
+    kept, remaining = [], max(budget, 0)
+    for message in messages[:start]:
+        tokens = count_tokens(message.content, model)
+        if tokens > remaining:
+            message = message.model_copy(update={"content": truncate_to_tokens(message.content, remaining, model)})
+            tokens = count_tokens(message.content, model)
+        if message.content:
+            kept.append(message)
+            remaining -= tokens
+
+    turns = []
+    for message in messages[start:]:
+        if message.type == "human" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    recent = take_within_budget(turns, remaining, from_end=True,
+                                count=lambda turn: sum(count_tokens(msg.content, model) for msg in turn))
+    return kept + [message for turn in recent for message in turn]
+
+def log_section_tokens(counts: dict, budget: int):
+    """
+    Logs per-section token counts for a turn.
+    """
+    total = sum(counts.values())
+    detail = ", ".join(f"{name}={tokens}" for name, tokens in counts.items())
+    logger.info("context tokens: %s (total %d of %d)", detail, total, budget)
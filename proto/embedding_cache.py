@@ -0,0 +1,165 @@
+# embedding_cache.py
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+def normalize_text(text: str) -> str:
+    """
+    Collapses whitespace so trivially different copies of a text share an embedding.
+    """
+    return " ".join(text.split())
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache on local disk.
+
+    Vectors live in a float32 memory-mapped file of fixed capacity (max_bytes / (dim * 4) rows);
+    a small JSON index maps sha256(model, normalized text) to a row and records LRU order.
+    When the file is full the least recently used row is overwritten. Each row's key digest is
+    also stored in a parallel memory-mapped file, and slots whose digest doesn't match are
+    dropped on load, so an index flushed before a row was reused can't return the wrong vector.
+    """
+
+    def __init__(self, directory: str, model: str, dim: int, max_bytes: int = 256 * 1024 * 1024,
+                 flush_interval: float = 5.0):
+        self.directory = directory
+        self.model = model
+        self.dim = dim
+        self.capacity = max(1, max_bytes // (dim * 4))
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, "index.json")
+        vectors_path = os.path.join(directory, "vectors.f32")
+        keys_path = os.path.join(directory, "keys.bin")
+        self._slots = OrderedDict()   # key -> row, least recently used first
+        if os.path.exists(self._index_path) and os.path.exists(keys_path):
+            with open(self._index_path, "r") as f:
+                meta = json.load(f)
+            if meta["dim"] == dim and meta["capacity"] == self.capacity:
+                self._slots = OrderedDict(meta["slots"])
+        mode = "r+" if self._slots and os.path.exists(vectors_path) else "w+"
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode=mode, shape=(self.capacity, dim))
+        self._keys = np.memmap(keys_path, dtype=np.uint8, mode=mode, shape=(self.capacity, 32))
+        for key, row in list(self._slots.items()):
+            if self._keys[row].tobytes() != bytes.fromhex(key):
+                del self._slots[key]
+        self._free = sorted(set(range(self.capacity)) - set(self._slots.values()), reverse=True)
+        atexit.register(self.flush)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: list, embed_fn) -> list:
+        """
+        Returns one embedding per text. Misses are embedded with a single embed_fn(list_of_texts)
+        call and stored; duplicate texts within the call are only embedded once.
+        """
+        keys = [self.key(text) for text in texts]
+        vectors = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                row = self._slots.get(key)
+                if row is None:
+                    missing.setdefault(key, []).append(i)
+                    continue
+                self._slots.move_to_end(key)
+                vectors[i] = self._vectors[row].tolist()
+                self.hits += 1
+            self.misses += sum(len(idx) for idx in missing.values())
+        if not missing:
+            return vectors
+
+        new_vectors = embed_fn([texts[idx[0]] for idx in missing.values()])
+        with self._lock:
+            for (key, idx), vector in zip(missing.items(), new_vectors):
+                self._store(key, vector)
+                for i in idx:
+                    vectors[i] = list(vector)
+            self._dirty = True
+        if time.monotonic() - self._last_flush > self.flush_interval:
+            self.flush()
+        return vectors
+
+    def get(self, text: str, embed_fn) -> list:
+        return self.get_many([text], embed_fn)[0]
+
+    def _store(self, key, vector):
+        row = self._slots.get(key)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                _, row = self._slots.popitem(last=False)
+        self._slots[key] = row
+        self._slots.move_to_end(key)
+        # Clear the digest before the vector changes and set it after, so a crash in between
+        # leaves a row that matches no key rather than the old key with the new vector
+        self._keys[row] = 0
+        self._vectors[row] = np.asarray(vector, dtype=np.float32)
+        self._keys[row] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+
+    def flush(self):
+        """
+        Writes pending vectors and the index to disk.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            self._vectors.flush()
+            self._keys.flush()
+            meta = {"dim": self.dim, "capacity": self.capacity, "slots": list(self._slots.items())}
+            tmp_path = f"{self._index_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, self._index_path)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._slots),
+            "capacity": self.capacity,
+        }
+
+_cache = None
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Returns the process-wide cache for the configured embedding model.
+    """
+    global _cache
+    if _cache is None:
+        from config import EMBEDDING_MODEL, EMBEDDING_DIM, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_BYTES
+        _cache = EmbeddingCache(EMBEDDING_CACHE_DIR, EMBEDDING_MODEL, EMBEDDING_DIM, EMBEDDING_CACHE_MAX_BYTES)
+    return _cache
+
+def embed_texts(texts: list) -> list:
+    """
+    Embeds document texts through the cache.
+    """
+    from config import get_embeddings
+    return get_embedding_cache().get_many(texts, get_embeddings().embed_documents)
+
+def embed_query(text: str) -> list:
+    """
+    Embeds a query through the cache.
+    """
+    from config import get_embeddings
+    return get_embedding_cache().get_many([text], lambda batch: [get_embeddings().embed_query(batch[0])])[0]
@@ -0,0 +1,177 @@
+# episodic_writer.py
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+
+class EpisodicWriter:
+    """
+    Write-behind persistence for finished sessions.
+
+    submit() appends the transcript to a local append-only spool (fsynced) and returns at once;
+    a background thread then runs the reflection + episodic insert and the procedural memory
+    update, retrying each with exponential backoff. Completed stages are recorded in a separate
+    ack file, so on restart any spooled session that wasn't fully processed is replayed from
+    the stage where it stopped. A stage that still fails after max_attempts is written to a
+    dead-letter file and acked, so one bad session can't block the sessions queued behind it.
+    """
+
+    STAGES = ("episodic", "procedural")
+
+    def __init__(self, spool_path: str = "./episodic_spool.jsonl", base_delay: float = 1.0, max_delay: float = 60.0,
+                 max_attempts: int = 8):
+        self.spool_path = spool_path
+        self.ack_path = f"{spool_path}.done"
+        self.dead_letter_path = f"{spool_path}.dead"
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._file_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """
+        Replays unfinished spooled sessions and starts the background worker.
+        """
+        if self._thread is not None:
+            return self
+        acked = self._read_acks()
+        pending = [job for job in self._read_spool() if any((job["id"], stage) not in acked for stage in self._stages(job))]
+        for job in pending:
+            job["done"] = [stage for stage in self._stages(job) if (job["id"], stage) in acked]
+            self._queue.put(job)
+        if pending:
+            print(f"Replaying {len(pending)} spooled session(s).")
+        self._thread = threading.Thread(target=self._run, name="episodic-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, conversation: str, what_worked, what_to_avoid, update_procedural: bool = True,
+               reflection: dict = None, unreflected: str = "") -> str:
+        """
+        Durably spools a finished session for background processing and returns its id.
+        reflection and unreflected carry a running reflection from the session (see
+        history.RunningReflection), so only the turns it doesn't cover are reflected on.
+        """
+        job = {
+            "id": uuid.uuid4().hex,
+            "conversation": conversation,
+            "what_worked": sorted(what_worked),
+            "what_to_avoid": sorted(what_to_avoid),
+            "update_procedural": update_procedural,
+            "reflection": reflection,
+            "unreflected": unreflected,
+        }
+        self._append(self.spool_path, json.dumps(job))
+        self._queue.put(dict(job, done=[]))
+        return job["id"]
+
+    def close(self, timeout: float = None) -> bool:
+        """
+        Waits up to timeout seconds for spooled sessions to finish. Returns True if the queue
+        drained; anything left over stays in the spool and is replayed on the next start().
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _stages(self, job):
+        return self.STAGES if job.get("update_procedural", True) else self.STAGES[:1]
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                for stage in self._stages(job):
+                    if stage not in job["done"]:
+                        error = self._with_retry(stage, job)
+                        if error is not None:
+                            self._append(self.dead_letter_path, json.dumps(dict(job, stage=stage, error=error)))
+                            print(f"\n({stage} memory write for session {job['id']} failed {self.max_attempts} times; "
+                                  f"moved to {self.dead_letter_path})")
+                        self._append(self.ack_path, f"{job['id']} {stage}")
+                        job["done"].append(stage)
+            finally:
+                self._queue.task_done()
+            if self._queue.unfinished_tasks == 0:
+                self._compact()
+
+    def _with_retry(self, stage, job):
+        """
+        Runs one stage, retrying with backoff. Returns None on success, or the last error
+        message once max_attempts have failed.
+        """
+        # Imported lazily so the spool can be written without loading the LLM/Supabase clients
+        from memory_manager import store_episodic_memory, procedural_memory_update
+        for attempt in range(self.max_attempts):
+            try:
+                if stage == "episodic":
+                    store_episodic_memory(job["conversation"], job.get("reflection"), job.get("unreflected", ""))
+                else:
+                    procedural_memory_update(set(job["what_worked"]), set(job["what_to_avoid"]))
+                return None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if attempt + 1 == self.max_attempts:
+                    return error
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                print(f"\n({stage} memory write failed: {e}; retrying in {delay:.1f}s)")
+                time.sleep(delay)
+
+    def _append(self, path, line):
+        with self._file_lock:
+            with open(path, "a") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _read_spool(self):
+        jobs = []
+        if os.path.exists(self.spool_path):
+            with open(self.spool_path, "r") as f:
+                for line in f:
+                    try:
+                        jobs.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-append; that session was never acknowledged to the user
+                        continue
+        return jobs
+
+    def _read_acks(self):
+        acked = set()
+        if os.path.exists(self.ack_path):
+            with open(self.ack_path, "r") as f:
+                acked = {tuple(line.split()) for line in f if line.strip()}
+        return acked
+
+    def _compact(self):
+        """
+        Once every spooled session is fully processed, truncate the spool and ack files.
+        """
+        with self._file_lock:
+            if self._queue.unfinished_tasks:
+                return
+            acked = self._read_acks()
+            if all((job["id"], stage) in acked for job in self._read_spool() for stage in self._stages(job)):
+                for path in (self.spool_path, self.ack_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+_writer = None
+
+def get_episodic_writer() -> EpisodicWriter:
+    """
+    Returns the process-wide writer, starting it (and replaying the spool) on first use.
+    """
+    global _writer
+    if _writer is None:
+        from config import EPISODIC_SPOOL_PATH
+        _writer = EpisodicWriter(EPISODIC_SPOOL_PATH).start()
+    return _writer
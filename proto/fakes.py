@@ -0,0 +1,212 @@
+# fakes.py
+import asyncio
+import fnmatch
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+class FakeQuery:
+    """
+    Chainable stand-in for a postgrest query builder over an in-memory list of rows.
+    """
+
+    def __init__(self, table, op="select", payload=None, **options):
+        self.table = table
+        self.op = op
+        self.payload = payload
+        self.options = options
+        self.filters = []
+        self.columns = "*"
+        self.limit_count = None
+        self.order_by = None
+
+    def select(self, columns="*"):
+        self.columns = columns
+        return self
+
+    def ilike(self, column, pattern):
+        # SQL ILIKE wildcards map onto fnmatch's
+        glob = pattern.replace("%", "*").replace("_", "?").lower()
+        self.filters.append(lambda row: fnmatch.fnmatchcase(str(row.get(column, "")).lower(), glob))
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, count):
+        self.limit_count = count
+        return self
+
+    def update(self, values):
+        self.op, self.payload = "update", values
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def execute(self):
+        return SimpleNamespace(data=self.table.client._run(self))
+
+class FakeTable:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def select(self, columns="*"):
+        return FakeQuery(self).select(columns)
+
+    def insert(self, rows):
+        return FakeQuery(self, "insert", rows)
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False, **kwargs):
+        return FakeQuery(self, "upsert", rows, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates)
+
+    def update(self, values):
+        return FakeQuery(self, "update", values)
+
+    def delete(self):
+        return FakeQuery(self, "delete")
+
+class FakeSupabase:
+    """
+    In-process stand-in for the Supabase client's table and rpc APIs, with a fixed
+    per-request latency (plus jitter) to model the network round-trip.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tables = {}
+        self.rpcs = {}
+        self.requests = 0
+        self._next_id = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        self.tables.setdefault(name, [])
+        return FakeTable(self, name)
+
+    def rpc(self, name, params=None):
+        handler = self.rpcs.get(name, lambda client, params: [])
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=self._wait(handler(self, params or {}))))
+
+    def _wait(self, result):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        return result
+
+    def _run(self, query):
+        with self._lock:
+            rows = self.tables.setdefault(query.table.name, [])
+            if query.op in ("insert", "upsert"):
+                new_rows = query.payload if isinstance(query.payload, list) else [query.payload]
+                key = query.options.get("on_conflict")
+                existing = {row.get(key): row for row in rows} if key else {}
+                result = []
+                for row in new_rows:
+                    if key and row.get(key) in existing:
+                        if not query.options.get("ignore_duplicates"):
+                            existing[row[key]].update(row)
+                        continue
+                    # Mirror the id SERIAL and created_at DEFAULT NOW() columns
+                    next_id = self._next_id.get(query.table.name, 0) + 1
+                    self._next_id[query.table.name] = next_id
+                    row = dict(row, id=next_id)
+                    row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+                    rows.append(row)
+                    result.append(row)
+            else:
+                matched = [row for row in rows if all(f(row) for f in query.filters)]
+                if query.op == "update":
+                    for row in matched:
+                        row.update(query.payload)
+                    result = matched
+                elif query.op == "delete":
+                    self.tables[query.table.name] = [row for row in rows if row not in matched]
+                    result = matched
+                else:
+                    if query.order_by:
+                        column, desc = query.order_by
+                        matched = sorted(matched, key=lambda row: row.get(column) or 0, reverse=desc)
+                    result = matched[:query.limit_count] if query.limit_count is not None else matched
+                    if query.columns != "*":
+                        names = [c.strip() for c in query.columns.split(",")]
+                        result = [{name: row.get(name) for name in names} for row in result]
+        return self._wait(result)
+
+FAKE_REFLECTION = {
+    "context_tags": ["protein_intake", "fat_loss_goals"],
+    "conversation_summary": "Discussed daily protein targets for fat loss",
+    "what_worked": "Giving gram-per-kilogram targets with food examples",
+    "what_to_avoid": "Recommending supplements before checking the user's diet",
+}
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model with configurable latency: first_token_latency before the reply
+    starts, then token_latency per output token. Reflection prompts get a valid reflection JSON;
+    everything else gets output_tokens words of filler.
+    """
+
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+    output_tokens: int = 50
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def model_name(self) -> str:
+        return "fake-chat"
+
+    def _reply_tokens(self, messages) -> list:
+        self.calls += 1
+        prompt = messages[-1].content if messages else ""
+        if "memory reflection" in prompt:
+            return [json.dumps(FAKE_REFLECTION)]
+        return [f"word{i % 97} " for i in range(self.output_tokens)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._reply_tokens(messages)
+        time.sleep(self.first_token_latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._reply_tokens(messages)
+        await asyncio.sleep(self.first_token_latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.first_token_latency)
+        for token in self._reply_tokens(messages):
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -1,7 +1,16 @@
 # helpers.py
+import hashlib
+
 def format_conversation(messages):
     """
     Formats a list of message objects (skipping the first system message)
     into a single newline-separated string.
     """
     return "\n".join(f"{msg.type.upper()}: {msg.content}" for msg in messages[1:])
+
+def chunk_hash(text):
+    """
+    Returns a stable content hash for a chunk of text, ignoring case and whitespace differences.
+    """
+    normalized = " ".join(text.split()).lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
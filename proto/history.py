@@ -0,0 +1,123 @@
+# history.py
+import asyncio
+from contextlib import nullcontext
+from langchain_core.messages import SystemMessage
+
+class ConversationHistory:
+    """
+    Session history that keeps the last keep_turns user/assistant turns verbatim and folds
+    older turns into a running summary, so the prompt stays roughly the same size however long
+    the session runs.
+
+    Summarization runs as a background task on the event loop. Until a turn has been folded
+    into the summary it is still sent verbatim, so nothing drops out of the prompt while the
+    summary catches up. llm_slot, if given, is called to get an async context manager held
+    around each summary call, so a server can count them against its LLM concurrency limit.
+    """
+
+    def __init__(self, keep_turns: int = 6, llm_slot=nullcontext):
+        self.keep_turns = keep_turns
+        self.llm_slot = llm_slot
+        self.transcript = []   # every non-system message, for episodic memory
+        self.summary = ""
+        self._folded = 0       # number of transcript messages already covered by the summary
+        self._task = None
+
+    def add_turn(self, user_message, ai_message):
+        """
+        Records a completed turn and starts folding old turns into the summary if needed.
+        """
+        self.transcript.extend([user_message, ai_message])
+        if self._unfolded_count() > 2 * self.keep_turns and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._fold())
+
+    def prompt_messages(self) -> list:
+        """
+        Messages to send ahead of the current turn: the running summary (if any) followed by
+        every turn not yet covered by it.
+        """
+        messages = self.transcript[self._folded:]
+        if self.summary:
+            messages = [SystemMessage(content=f"Summary of the earlier conversation: {self.summary}")] + messages
+        return messages
+
+    async def wait(self):
+        """
+        Waits for any in-flight summarization to finish.
+        """
+        if self._task is not None:
+            await self._task
+
+    def _unfolded_count(self) -> int:
+        return len(self.transcript) - self._folded
+
+    async def _fold(self):
+        # Imported lazily so building a history doesn't pull in the LLM client
+        from prompts import update_summary
+        while self._unfolded_count() > 2 * self.keep_turns:
+            end = len(self.transcript) - 2 * self.keep_turns
+            turns = _format_turns(self.transcript[self._folded:end])
+            try:
+                async with self.llm_slot():
+                    self.summary = await update_summary(self.summary, turns)
+            except Exception as e:
+                # Leave the turns verbatim and try again after the next turn
+                print(f"\n(history summary failed: {e})")
+                return
+            self._folded = end
+
+class RunningReflection:
+    """
+    Episodic reflection on a session, kept up to date while the session runs.
+
+    Every every_turns turns a background task merges only the turns added since the last
+    update into the running reflection, so at the end of the session at most a few turns are
+    left to reflect on, however long the session was. llm_slot works as in ConversationHistory.
+    """
+
+    def __init__(self, transcript: list, every_turns: int = 4, llm_slot=nullcontext):
+        self.transcript = transcript   # shared with ConversationHistory.transcript
+        self.every_turns = every_turns
+        self.llm_slot = llm_slot
+        self.reflection = None
+        self._reflected = 0            # number of transcript messages covered by the reflection
+        self._task = None
+
+    def turn_added(self):
+        """
+        Starts a background update once every_turns new turns have accumulated.
+        """
+        if self._pending_count() >= 2 * self.every_turns and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._update())
+
+    def snapshot(self):
+        """
+        Returns (reflection, unreflected turns) for handing off at session end: the running
+        reflection (None if no update has finished) and the formatted turns it doesn't cover
+        yet. An in-flight update is cancelled; its turns are included in the unreflected text.
+        Must be called on the event loop that runs the updates.
+        """
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        return self.reflection, _format_turns(self.transcript[self._reflected:])
+
+    def _pending_count(self) -> int:
+        return len(self.transcript) - self._reflected
+
+    async def _update(self):
+        # Imported lazily so building a session doesn't pull in the LLM client
+        from prompts import aupdate_reflection
+        while self._pending_count() >= 2 * self.every_turns:
+            end = len(self.transcript)
+            try:
+                async with self.llm_slot():
+                    self.reflection = await aupdate_reflection(self.reflection,
+                                                               _format_turns(self.transcript[self._reflected:end]))
+            except Exception as e:
+                # The turns stay unreflected and are picked up by the next update or at session end
+                print(f"\n(running reflection failed: {e})")
+                return
+            self._reflected = end
+
+def _format_turns(messages) -> str:
+    return "\n".join(f"{msg.type.upper()}: {msg.content}" for msg in messages)
@@ -0,0 +1,84 @@
+# import_budget.py
+"""
+Guards cold-start time of the CLI and ingestion entry points.
+
+Each module is imported in a fresh interpreter under `python -X importtime`, with no API
+credentials in the environment. The check fails if an import raises, exceeds its time budget
+(median of --runs), or pulls in a client library that should only load on first use.
+
+    python import_budget.py            # exit 1 if any entry point is over budget
+    python import_budget.py --scale 2  # looser budgets on slow machines
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Cumulative import time budgets in milliseconds
+BUDGETS_MS = {
+    "config": 50,
+    "ingest": 100,
+    "memory_manager": 300,
+    "prompts": 300,
+    "consolidate": 300,
+    "backfill": 300,
+    "trainer": 800,
+}
+
+# Client libraries that must not be imported until a client is actually used
+DEFERRED = ("openai", "langchain_openai", "supabase", "langchain_community")
+
+LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)")
+
+def measure(module: str) -> tuple:
+    """
+    Imports module in a fresh interpreter; returns (cumulative ms, set of imported top-level packages).
+    """
+    env = {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "SUPABASE_URL", "SUPABASE_KEY")}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=HERE, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    total_us = 0
+    packages = set()
+    for match in LINE.finditer(result.stderr):
+        cumulative, indent, name = match.groups()
+        packages.add(name.split(".")[0])
+        if name == module and not indent:
+            total_us = int(cumulative)
+    return total_us / 1000, packages
+
+def check(runs: int = 3, scale: float = 1.0) -> list:
+    failures = []
+    print(f"{'module':<18}{'median ms':>11}{'budget ms':>11}")
+    for module, budget in BUDGETS_MS.items():
+        try:
+            samples = [measure(module) for _ in range(runs)]
+        except RuntimeError as e:
+            failures.append(str(e))
+            continue
+        median = statistics.median(ms for ms, _ in samples)
+        print(f"{module:<18}{median:>11.1f}{budget * scale:>11.0f}")
+        if median > budget * scale:
+            failures.append(f"{module}: {median:.1f} ms exceeds budget of {budget * scale:.0f} ms")
+        eager = sorted(set(DEFERRED) & samples[0][1])
+        if eager:
+            failures.append(f"{module}: imports {', '.join(eager)} eagerly")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check import time of the entry points against budgets.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget by this factor")
+    args = parser.parse_args()
+    failures = check(args.runs, args.scale)
+    if failures:
+        print("\nIMPORT BUDGET FAILURES:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll entry points within budget.")
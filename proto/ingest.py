@@ -0,0 +1,124 @@
+# ingest.py
+import argparse
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pdf_chunker import iter_pdf_chunks, iter_pdf_token_chunks
+
+def find_pdfs(paths):
+    """
+    Expands files and directories into a sorted list of PDF paths.
+    """
+    pdfs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                pdfs.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+        else:
+            pdfs.append(path)
+    return sorted(pdfs)
+
+def chunk_file(path, out_queue, chunk_size, chunk_overlap, batch_size, unit="chars"):
+    """
+    Worker: streams one PDF through the chunker and puts batches of chunks on the shared queue,
+    followed by a ("done", path, pages, chunks, error) message. pages is the reader's page
+    count, so trailing pages that yield no text still count. Errors are reported rather than
+    raised so one bad file doesn't stop the rest of the run. With unit="tokens", chunk_size and
+    chunk_overlap are measured in model tokens instead of characters.
+    """
+    pages = chunks = 0
+    batch = []
+    try:
+        from pypdf import PdfReader
+        # Reads only the page tree; text is extracted once, by the chunker
+        pages = len(PdfReader(path).pages)
+        if unit == "tokens":
+            chunker = iter_pdf_token_chunks(path, chunk_tokens=chunk_size, overlap_tokens=chunk_overlap)
+        else:
+            chunker = iter_pdf_chunks(path, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        for chunk in chunker:
+            chunk["source"] = os.path.basename(path)
+            batch.append(chunk)
+            chunks += 1
+            if len(batch) >= batch_size:
+                out_queue.put(("chunks", path, batch))
+                batch = []
+        if batch:
+            out_queue.put(("chunks", path, batch))
+        out_queue.put(("done", path, pages, chunks, None))
+    except Exception as e:
+        out_queue.put(("done", path, pages, chunks, f"{type(e).__name__}: {e}"))
+
+def ingest(paths, workers: int = None, chunk_size: int = 800, chunk_overlap: int = 0,
+           batch_size: int = 200, max_in_flight: int = 4, queue_size: int = 32, embed: bool = False,
+           unit: str = "chars"):
+    """
+    Chunks every PDF under paths in a process pool and streams the chunks through a bounded
+    queue to a single batched writer. Returns a per-file summary dict.
+    """
+    pdfs = find_pdfs(paths)
+    if not pdfs:
+        print("No PDFs found.")
+        return {}
+    results = {}
+    start = time.perf_counter()
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers) as pool:
+        chunk_queue = manager.Queue(maxsize=queue_size)
+        futures = [pool.submit(chunk_file, path, chunk_queue, chunk_size, chunk_overlap, batch_size, unit)
+                   for path in pdfs]
+        # Imported only now: with the fork start method the pool starts all its workers on the
+        # first submit, so they are forked before memory_manager and its clients are loaded
+        from memory_manager import load_pdf_chunks_to_db
+
+        def drain():
+            while len(results) < len(pdfs):
+                try:
+                    message = chunk_queue.get(timeout=1)
+                except queue.Empty:
+                    # A worker that died without reporting would otherwise hang the writer
+                    if all(future.done() for future in futures) and chunk_queue.empty():
+                        for path in pdfs:
+                            results.setdefault(path, {"pages": 0, "chunks": 0, "error": "worker exited"})
+                        break
+                    continue
+                if message[0] == "chunks":
+                    yield from message[2]
+                    continue
+                _, path, pages, chunks, error = message
+                results[path] = {"pages": pages, "chunks": chunks, "error": error}
+                status = f"FAILED ({error})" if error else f"{pages} pages, {chunks} chunks"
+                print(f"[{len(results)}/{len(pdfs)}] {path}: {status}")
+
+        failed_rows = load_pdf_chunks_to_db(drain(), batch_size=batch_size, max_in_flight=max_in_flight, embed=embed)
+    for path, result in results.items():
+        result["failed_chunks"] = sum(row.get("source") == os.path.basename(path) for row in failed_rows)
+
+    elapsed = time.perf_counter() - start
+    total_pages = sum(r["pages"] for r in results.values())
+    total_chunks = sum(r["chunks"] for r in results.values())
+    failed = [path for path, r in results.items() if r["error"]]
+    print(f"Ingested {len(pdfs) - len(failed)}/{len(pdfs)} files in {elapsed:.2f}s: "
+          f"{total_pages / elapsed:.1f} pages/sec, {total_chunks / elapsed:.1f} chunks/sec.")
+    if failed:
+        print("Failed files:", ", ".join(failed))
+    if failed_rows:
+        print(f"{len(failed_rows)} chunks failed to load; re-run the ingest to retry them.")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunk and load PDFs into semantic memory.")
+    parser.add_argument("paths", nargs="+", help="PDF files or directories to ingest")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=0)
+    parser.add_argument("--unit", choices=("chars", "tokens"), default="chars",
+                        help="measure --chunk-size and --chunk-overlap in characters or model tokens")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--embed", action="store_true", help="also store chunk embeddings (cached on disk)")
+    args = parser.parse_args()
+    ingest(args.paths, workers=args.workers, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap,
+           batch_size=args.batch_size, max_in_flight=args.max_in_flight, embed=args.embed, unit=args.unit)
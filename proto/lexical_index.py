@@ -0,0 +1,155 @@
+# lexical_index.py
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his
+how i if in into is it its itself just me more most my no nor not now of off on once only or other our ours out
+over own same she should so some such than that the their theirs them then there these they this those through
+to too under until up very was we were what when where which while who whom why will with would you your yours
+""".split())
+
+
+def tokenize(text: str) -> list:
+    """
+    Lowercases text and splits it into alphanumeric terms, dropping stopwords.
+    """
+    return [tok for tok in TOKEN_PATTERN.findall(text.lower()) if tok not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory inverted index over text chunks, scored with Okapi BM25.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = []        # chunk text, indexed by doc id (None once removed)
+        self.doc_lens = []    # token count per doc
+        self.postings = {}    # term -> {doc_id: term frequency}
+        self._doc_ids = {}    # chunk text -> doc id, so re-adding a chunk is a no-op
+        self._idf = None
+
+    @classmethod
+    def build(cls, chunks, **kwargs) -> "BM25Index":
+        """
+        Builds an index from an iterable of chunk strings.
+        """
+        index = cls(**kwargs)
+        index.add(chunks)
+        return index
+
+    def __len__(self):
+        return len(self._doc_ids)
+
+    def __contains__(self, chunk):
+        return chunk in self._doc_ids
+
+    def add(self, chunks):
+        """
+        Adds chunk strings to the index, skipping any already present.
+        """
+        for chunk in chunks:
+            if chunk in self._doc_ids:
+                continue
+            doc_id = len(self.docs)
+            self._doc_ids[chunk] = doc_id
+            terms = tokenize(chunk)
+            self.docs.append(chunk)
+            self.doc_lens.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+        self._idf = None
+
+    def remove(self, chunks):
+        """
+        Removes chunk strings from the index. Their doc ids are left empty rather than reused,
+        so removal only touches the removed chunks' postings.
+        """
+        for chunk in chunks:
+            doc_id = self._doc_ids.pop(chunk, None)
+            if doc_id is None:
+                continue
+            for term in set(tokenize(chunk)):
+                docs = self.postings.get(term)
+                if docs is not None:
+                    docs.pop(doc_id, None)
+                    if not docs:
+                        del self.postings[term]
+            self.docs[doc_id] = None
+            self.doc_lens[doc_id] = 0
+        self._idf = None
+
+    def _ensure_idf(self):
+        if self._idf is None:
+            n = len(self._doc_ids)
+            self._idf = {
+                term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for term, docs in self.postings.items()
+            }
+            avg_len = (sum(self.doc_lens) / n) if n else 1.0
+            # Per-document length normalisation, precomputed so queries only do the tf term
+            self._norms = [self.k1 * (1 - self.b + self.b * dl / avg_len) for dl in self.doc_lens]
+
+    def search(self, query: str, k: int = 15) -> list:
+        """
+        Returns up to k (doc_id, score) pairs ranked by BM25 score.
+        """
+        self._ensure_idf()
+        if not self._doc_ids:
+            return []
+        k1_plus_1, norms = self.k1 + 1, self._norms
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self._idf[term]
+            for doc_id, tf in docs.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * k1_plus_1 / (tf + norms[doc_id])
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def top_chunks(self, query: str, k: int = 15) -> list:
+        """
+        Returns the text of the top-k chunks for a query.
+        """
+        return [self.docs[doc_id] for doc_id, _ in self.search(query, k)]
+
+    def save(self, path: str):
+        """
+        Persists the index to a JSON file, writing atomically.
+        """
+        payload = {
+            "k1": self.k1,
+            "b": self.b,
+            "docs": self.docs,
+            "doc_lens": self.doc_lens,
+            "postings": {term: list(docs.items()) for term, docs in self.postings.items()},
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """
+        Loads an index previously written with save().
+        """
+        with open(path, "r") as f:
+            payload = json.load(f)
+        index = cls(k1=payload["k1"], b=payload["b"])
+        index.docs = payload["docs"]
+        index.doc_lens = payload["doc_lens"]
+        index._doc_ids = {chunk: doc_id for doc_id, chunk in enumerate(index.docs) if chunk is not None}
+        index.postings = {term: dict(docs) for term, docs in payload["postings"].items()}
+        index._ensure_idf()
+        return index
@@ -0,0 +1,217 @@
+# llm_cache.py
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+def normalize_prompt(messages) -> str:
+    """
+    Serializes a prompt (a string or a list of messages) with whitespace collapsed, so
+    formatting-only differences map to the same cache key.
+    """
+    if isinstance(messages, str):
+        return " ".join(messages.split())
+    return "\n".join(f"{msg.type}: {' '.join(str(msg.content).split())}" for msg in messages)
+
+def fingerprint(*parts) -> str:
+    """
+    Short stable hash of the given strings, used to tie semantic hits to the same retrieved context.
+    """
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:32]
+
+class LLMCache:
+    """
+    Persistent two-tier response cache in a local SQLite file.
+
+    The exact tier is keyed on (model, temperature, normalized prompt). The optional semantic
+    tier matches a new query against stored query embeddings by cosine similarity, but only
+    among entries with the same scope (model, temperature, context fingerprint and the rest of
+    the prompt), so a cached answer is never reused against different retrieved context or a
+    different conversation history. Entries expire after ttl seconds and
+    the least recently used ones are evicted beyond max_entries.
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                embedding BLOB,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_scope_idx ON llm_cache (scope)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used_idx ON llm_cache (last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def key(model: str, temperature, prompt) -> str:
+        return fingerprint(model, str(temperature), normalize_prompt(prompt))
+
+    def get(self, key: str, scope: str = None, embedding=None, threshold: float = None):
+        """
+        Returns the cached response for key, or, when embedding and threshold are given, the
+        response of the most similar entry in scope at or above threshold. None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self._touch(key, now)
+                self.exact_hits += 1
+                return row[0]
+            if embedding is not None and threshold is not None and scope is not None:
+                rows = self._db.execute(
+                    "SELECT key, embedding, response FROM llm_cache WHERE scope = ? AND embedding IS NOT NULL AND created_at >= ?",
+                    (scope, now - self.ttl),
+                ).fetchall()
+                if rows:
+                    matrix = np.stack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+                    query = np.asarray(embedding, dtype=np.float32)
+                    sims = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+                    best = int(np.argmax(sims))
+                    if sims[best] >= threshold:
+                        self._touch(rows[best][0], now)
+                        self.semantic_hits += 1
+                        return rows[best][2]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: str, scope: str = None, embedding=None):
+        """
+        Stores a response, evicting expired and least recently used entries as needed.
+        """
+        now = time.time()
+        blob = np.asarray(embedding, dtype=np.float32).tobytes() if embedding is not None else None
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, scope, embedding, response, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, scope or "", blob, response, now, now),
+            )
+            self._db.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+            self._db.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def _touch(self, key, now):
+        self._db.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+        self._db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
+
+class CachedChatModel:
+    """
+    Wraps a chat model with an LLMCache. invoke/ainvoke/astream take the usual prompt plus,
+    for the semantic tier, the user's query text and a fingerprint of the retrieved context.
+    The async methods run cache lookups, query embedding and writes on a worker thread.
+    """
+
+    def __init__(self, llm, cache: LLMCache, embed_fn=None, semantic_threshold: float = None):
+        self.llm = llm
+        self.cache = cache
+        self.embed_fn = embed_fn
+        self.semantic_threshold = semantic_threshold
+        self.model = getattr(llm, "model_name", type(llm).__name__)
+        self.temperature = getattr(llm, "temperature", None)
+
+    def _lookup(self, prompt, query, context):
+        key = self.cache.key(self.model, self.temperature, prompt)
+        scope = embedding = None
+        if self.semantic_threshold is not None and self.embed_fn and query and context is not None:
+            # Everything before the final (user) message is in the scope, so a follow-up like "why?"
+            # only matches answers given after the same conversation history
+            history = "" if isinstance(prompt, str) else normalize_prompt(prompt[:-1])
+            scope = fingerprint(self.model, str(self.temperature), context, history)
+            embedding = self.embed_fn(query)
+        return key, scope, embedding, self.cache.get(key, scope, embedding, self.semantic_threshold)
+
+    def invoke(self, prompt, query: str = None, context: str = None):
+        key, scope, embedding, cached = self._lookup(prompt, query, context)
+        if cached is not None:
+            from langchain_core.messages import AIMessage
+            return AIMessage(content=cached)
+        response = self.llm.invoke(prompt)
+        self.cache.put(key, response.content, scope, embedding)
+        return response
+
+    async def ainvoke(self, prompt, query: str = None, context: str = None):
+        key, scope, embedding, cached = await asyncio.to_thread(self._lookup, prompt, query, context)
+        if cached is not None:
+            from langchain_core.messages import AIMessage
+            return AIMessage(content=cached)
+        response = await self.llm.ainvoke(prompt)
+        await asyncio.to_thread(self.cache.put, key, response.content, scope, embedding)
+        return response
+
+    async def astream(self, prompt, query: str = None, context: str = None):
+        key, scope, embedding, cached = await asyncio.to_thread(self._lookup, prompt, query, context)
+        if cached is not None:
+            from langchain_core.messages import AIMessageChunk
+            yield AIMessageChunk(content=cached)
+            return
+        parts = []
+        async for chunk in self.llm.astream(prompt):
+            parts.append(chunk.content)
+            yield chunk
+        await asyncio.to_thread(self.cache.put, key, "".join(parts), scope, embedding)
+
+_cached_llm = None
+_cache = None
+
+def get_llm_cache() -> LLMCache:
+    """
+    Returns the process-wide response cache.
+    """
+    global _cache
+    if _cache is None:
+        from config import LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES
+        _cache = LLMCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES)
+    return _cache
+
+def get_cached_llm() -> CachedChatModel:
+    """
+    Returns the shared chat model wrapped with the response cache; the semantic tier is enabled when
+    LLM_CACHE_SEMANTIC_THRESHOLD is set.
+    """
+    global _cached_llm
+    if _cached_llm is None:
+        from config import get_llm, LLM_CACHE_SEMANTIC_THRESHOLD
+        from embedding_cache import embed_query
+        _cached_llm = CachedChatModel(get_llm(), get_llm_cache(), embed_fn=embed_query,
+                                      semantic_threshold=LLM_CACHE_SEMANTIC_THRESHOLD)
+    return _cached_llm
+
+def cached_json(namespace: str, text: str, compute):
+    """
+    Exact-match cache for a JSON-serializable result derived from text (e.g. a reflection).
+    """
+    cache = get_llm_cache()
+    key = fingerprint(namespace, normalize_prompt(text))
+    cached = cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
+    result = compute(text)
+    cache.put(key, json.dumps(result))
+    return result
@@ -1,30 +1,178 @@
-from config import supabase, llm
-from helpers import format_conversation
-from prompts import create_reflection
-from langchain_core.messages import SystemMessage, HumanMessage
+import os
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from config import (
+    get_supabase, get_llm, LEXICAL_INDEX_PATH, VECTOR_INDEX_DIR, DEDUP_THRESHOLD, DEDUP_RECENT,
+    SEMANTIC_MIN_SCORE_RATIO, VECTOR_MIN_SCORE_RATIO, SEMANTIC_DEDUP_THRESHOLD, SEMANTIC_MMR_LAMBDA,
+    SEMANTIC_CANDIDATE_FACTOR, EMBEDDING_DIM
+)
+from helpers import format_conversation, chunk_hash
+from prompts import create_reflection, update_reflection
+from lexical_index import BM25Index
+from vector_index import QuantizedVectorIndex
+from storage import get_store
+from embedding_cache import embed_texts, embed_query, get_embedding_cache
+from chunk_selection import select_chunks, selection_stats
+from near_duplicates import minhash, LSHIndex
+from context_budget import count_tokens, truncate_to_tokens, allocate_budget
+import tracing
+from tracing import span, payload_bytes
+
+_lexical_index = None
+_vector_index = None
+
+def get_lexical_index():
+    """
+    Return the BM25 index over semantic memory chunks, loading it from disk on first use.
+    Returns None if no index has been built yet.
+    """
+    global _lexical_index
+    if _lexical_index is None and os.path.exists(LEXICAL_INDEX_PATH):
+        _lexical_index = BM25Index.load(LEXICAL_INDEX_PATH)
+    return _lexical_index
+
+def get_vector_index():
+    """
+    Return the local quantized vector index (see vector_index.py), loading it on first use.
+    Returns None if it has not been built, in which case vector search goes to the store.
+    """
+    global _vector_index
+    if _vector_index is None and QuantizedVectorIndex.exists(VECTOR_INDEX_DIR):
+        _vector_index = QuantizedVectorIndex.load(VECTOR_INDEX_DIR)
+    return _vector_index
 
 def add_episodic_memory(messages):
     """
     Generate a reflection from the conversation and store it in the episodic_memory table.
     """
-    conversation = format_conversation(messages)
-    reflection = create_reflection(conversation)
+    try:
+        outcome, row = store_episodic_memory(format_conversation(messages))
+    except RuntimeError as e:
+        print(e)
+        return
+    if outcome == "stored":
+        print("Episodic memory stored successfully!")
+    elif outcome == "merged":
+        print(f"Episodic memory merged into existing memory {row['id']}.")
+    else:
+        print(f"Episodic memory not stored: near-duplicate of memory {row['id']}.")
+
+def store_episodic_memory(conversation: str, reflection: dict = None, unreflected: str = ""):
+    """
+    Reflect on a formatted conversation and insert it into the episodic_memory table.
+    If the session kept a running reflection, pass it with the turns it doesn't cover yet
+    (unreflected); only those turns are merged in, instead of reflecting on the whole transcript.
+    Near-duplicates of recent memories are not stored again: a transcript that matches a recent
+    one is skipped before any reflection is run, and a reflection whose summary matches a recent
+    one is merged into that row (tags and what worked / what to avoid unioned, recency refreshed).
+    Conversations too short to fingerprint are always stored. Returns (outcome, row), where
+    outcome is "stored", "skipped" or "merged" and row is the new or matched row.
+    Raises RuntimeError if the insert returns no data.
+    """
+    transcript_index, summary_index = get_duplicate_indexes()
+    transcript_sig = minhash(conversation)
+    while match := transcript_index.best_match(transcript_sig, DEDUP_THRESHOLD):
+        row = _touch_episodic_memory(match[0])
+        if row:
+            print(f"Near-duplicate of episodic memory {match[0]} (similarity {match[1]:.2f}), skipping.")
+            return "skipped", row
+        _forget_episodic_memory(match[0])
+
+    if reflection is None:
+        reflection = create_reflection(conversation)
+    elif unreflected:
+        reflection = update_reflection(reflection, unreflected)
+    summary_sig = minhash(reflection['conversation_summary'])
+    while match := summary_index.best_match(summary_sig, DEDUP_THRESHOLD):
+        row = _touch_episodic_memory(match[0], reflection['context_tags'],
+                                     reflection['what_worked'], reflection['what_to_avoid'])
+        if row:
+            print(f"Summary matches episodic memory {match[0]} (similarity {match[1]:.2f}), merging.")
+            transcript_index.add(match[0], transcript_sig)
+            return "merged", row
+        _forget_episodic_memory(match[0])
+
     data = {
         "conversation": conversation,
         "context_tags": reflection['context_tags'],
         "conversation_summary": reflection['conversation_summary'],
         "what_worked": reflection['what_worked'],
         "what_to_avoid": reflection['what_to_avoid'],
+        "transcript_minhash": transcript_sig,
+        "summary_minhash": summary_sig,
     }
     
-    response = supabase.table("episodic_memory").insert(data).execute()
-    # print("Response from insert:", response)
-    
+    store = get_store()
+    with span("db.insert", table="episodic_memory", backend=store.name) as sp:
+        if tracing.ENABLED:
+            sp.set_attribute("payload_bytes", payload_bytes(data))
+        row = store.insert_episodic(data)
+        sp.set_attribute("rows", int(row is not None))
+
     # Check if any data was returned from the insert
-    if not response.data:
-        print("Error inserting memory. Response:", response)
-    else:
-        print("Episodic memory stored successfully!")
+    if not row:
+        raise RuntimeError("Error inserting memory: the insert returned no row.")
+    transcript_index.add(row["id"], transcript_sig)
+    summary_index.add(row["id"], summary_sig)
+    return "stored", row
+
+_duplicate_indexes = None
+
+def get_duplicate_indexes():
+    """
+    Return LSH indexes over the transcript and summary MinHash signatures of the most recent
+    episodic memories, loading them from the table on first use.
+    """
+    global _duplicate_indexes
+    if _duplicate_indexes is None:
+        transcript_index = LSHIndex(max_items=DEDUP_RECENT)
+        summary_index = LSHIndex(max_items=DEDUP_RECENT)
+        rows = get_store().recent_episodic_signatures(DEDUP_RECENT)
+        # Oldest first, so the bounded indexes evict the oldest memories as new ones arrive
+        for row in reversed(rows):
+            transcript_index.add(row["id"], row.get("transcript_minhash"))
+            summary_index.add(row["id"], row.get("summary_minhash"))
+        _duplicate_indexes = (transcript_index, summary_index)
+    return _duplicate_indexes
+
+def _forget_episodic_memory(memory_id):
+    """
+    Drop a memory that no longer exists (e.g. consolidated by another process) from the
+    near-duplicate indexes.
+    """
+    for index in get_duplicate_indexes():
+        index.remove(memory_id)
+
+def _merge_sentences(existing: str, new: str) -> str:
+    """
+    Union of two '. '-separated lists of points (the form what_worked and what_to_avoid are
+    split on when building the system prompt), keeping the existing order.
+    """
+    points = [p for p in (existing or "").split('. ') if p.strip()]
+    points += [p for p in (new or "").split('. ') if p.strip() and p not in points]
+    return '. '.join(points)
+
+def _touch_episodic_memory(memory_id, context_tags=None, what_worked=None, what_to_avoid=None):
+    """
+    Refresh a memory's recency, optionally merging in new context tags and what worked / what
+    to avoid, and return the row, or None if the memory no longer exists.
+    """
+    update = {"created_at": datetime.now(timezone.utc).isoformat()}
+    store = get_store()
+    if context_tags or what_worked or what_to_avoid:
+        current = store.get_episodic(memory_id)
+        if current is None:
+            return None
+        if context_tags:
+            existing = current.get("context_tags") or []
+            update["context_tags"] = existing + [tag for tag in context_tags if tag not in existing]
+        if what_worked:
+            update["what_worked"] = _merge_sentences(current.get("what_worked"), what_worked)
+        if what_to_avoid:
+            update["what_to_avoid"] = _merge_sentences(current.get("what_to_avoid"), what_to_avoid)
+    return store.update_episodic(memory_id, update)
 
 # CONDENSED VERSION OF INSERTING EPISODIC MEMORY
 # def add_episodic_memory(messages):
@@ -66,55 +214,112 @@ def add_episodic_memory(messages):
 
 def episodic_recall(query: str):
     """
-    Retrieve episodic memory from the episodic_memory table using a simple text search.
+    Retrieve the most relevant episodic memory for the query, or None.
     """
-    response = supabase.table("episodic_memory") \
-        .select("*") \
-        .ilike("conversation", f"%{query}%") \
-        .limit(1) \
-        .execute()
-    
-    if response.data and len(response.data) > 0:
-        return response.data[0]
-    else:
-        # print("No episodic memory found for query:", query)
-        return None
+    memories = episodic_recall_top_k(query, k=1)
+    return memories[0] if memories else None
 
-def semantic_recall(query: str):
+def episodic_recall_top_k(query: str, k: int = 3, recency_half_life_days: float = 30.0) -> list:
     """
-    Retrieve semantic memory (chunks) from the crossfit_nutrition table using a simple text search.
+    Retrieve the top-k episodic memories ranked by full-text relevance of their summary and
+    context tags, weighted towards recent memories. On Supabase this is the match_episodic_memory
+    RPC created by ensure_episodic_search_index; on SQLite the FTS5 index computes the same
+    ranking. Returns only the columns the system prompt needs.
+    """
+    with span("episodic_recall", k=k) as sp:
+        memories = get_store().match_episodic(query, k, recency_half_life_days)
+        sp.set_attribute("rows", len(memories))
+    return memories
+
+def _select(sp, chunks: list, scores: list, k: int, min_score_ratio: float) -> list:
+    """
+    Run post-retrieval selection (chunk_selection.py) over ranked candidates and record the
+    chunks and context tokens it removed from, and added to, the first k. Returns selected indexes.
+    """
+    selected = select_chunks(chunks, scores, k, min_score_ratio, SEMANTIC_DEDUP_THRESHOLD, SEMANTIC_MMR_LAMBDA)
+    removed, added = selection_stats.record(chunks[:k], [chunks[i] for i in selected])
+    sp.set_attribute("candidates", len(chunks))
+    sp.set_attribute("rows", len(selected))
+    sp.set_attribute("tokens_removed", removed)
+    sp.set_attribute("tokens_added", added)
+    return selected
+
+def semantic_recall_chunks(query: str, k: int = 15) -> list:
+    """
+    Retrieve up to k semantic memory chunks ranked by the local BM25 index, with low-scoring,
+    overlapping and redundant chunks dropped (see chunk_selection.py), so fewer than k come back
+    when fewer are useful. Falls back to the storage backend's text search on crossfit_nutrition
+    if no index has been built.
+    """
+    with span("semantic_recall", k=k) as sp:
+        index = get_lexical_index()
+        candidates = k * SEMANTIC_CANDIDATE_FACTOR
+        if index is not None:
+            hits = index.search(query, candidates)
+            chunks = [index.docs[doc_id] for doc_id, _ in hits]
+            scores = [score for _, score in hits]
+            sp.set_attribute("source", "bm25")
+        else:
+            rows = get_store().search_chunks(query, candidates)
+            chunks = [row["chunk"] for row in rows]
+            # Supabase's substring search has no scores; selection then falls back to rank
+            scores = [row["score"] for row in rows] if rows and rows[0]["score"] is not None else None
+            sp.set_attribute("source", "table")
+        selected = _select(sp, chunks, scores, k, SEMANTIC_MIN_SCORE_RATIO)
+    return [chunks[i] for i in selected]
+
+def semantic_selection_stats() -> dict:
+    """
+    Chunks and context tokens removed and added by post-retrieval selection, per recall, since startup.
+    """
+    return selection_stats.stats()
+
+def format_chunks(chunks: list) -> str:
+    """
+    Number chunks into the CHUNK n: blocks used in the grounding message.
     """
-    response = supabase.table("crossfit_nutrition") \
-        .select("*") \
-        .ilike("chunk", f"%{query}%") \
-        .limit(15) \
-        .execute()
-    
     combined_text = ""
-    if response.data and len(response.data) > 0:
-        for i, item in enumerate(response.data):
-            combined_text += f"\nCHUNK {i+1}:\n{item['chunk'].strip()}"
-    # else:
-        # print("No semantic chunks found for query:", query)
+    for i, chunk in enumerate(chunks):
+        combined_text += f"\nCHUNK {i+1}:\n{chunk.strip()}"
     return combined_text
 
+def semantic_recall(query: str, k: int = 15):
+    """
+    Retrieve semantic memory (chunks) as a single CHUNK-numbered string.
+    """
+    return format_chunks(semantic_recall_chunks(query, k))
+
 def semantic_rag(query: str):
     """
     Create a context message using semantic recall.
     """
-    memories = semantic_recall(query)
+    return build_semantic_message(semantic_recall(query))
+
+def build_semantic_message(memories: str):
+    """
+    Wrap recalled semantic chunks in the grounding message sent ahead of the user's question.
+    """
     semantic_prompt = f"""If needed, use this grounded context to factually answer the next question.
 Let me know if you do not have enough information or context to answer.
     
 {memories}
 """
+    from langchain_core.messages import HumanMessage
     return HumanMessage(semantic_prompt)
 
 def episodic_system_prompt(query: str, conversations, what_worked, what_to_avoid):
     """
     Build a system prompt by recalling previous episodic memories and incorporating procedural instructions.
     """
-    memory = episodic_recall(query)
+    return build_episodic_system_prompt(episodic_recall(query), conversations, what_worked, what_to_avoid)
+
+def build_episodic_system_prompt(memory, conversations, what_worked, what_to_avoid, token_budget: int = None):
+    """
+    Build the system prompt from an already-recalled episodic memory (or None), updating the
+    session's conversations, what_worked and what_to_avoid in place.
+    With token_budget set, the recalled parts are truncated to fit, in priority order:
+    what worked, what to avoid, the matched conversation, then previous conversations.
+    """
     if not memory:
         current_conversation = "N/A"
     else:
@@ -132,19 +337,36 @@ def episodic_system_prompt(query: str, conversations, what_worked, what_to_avoid
     except FileNotFoundError:
         procedural_memory = "No procedural guidelines available."
     
-    previous_convos = [conv for conv in conversations[-4:] if conv != current_conversation][-3:]
-    episodic_prompt = f"""You are a helpful AI Assistant. Answer the user's questions to the best of your ability.
+    previous_convos = ' | '.join([conv for conv in conversations[-4:] if conv != current_conversation][-3:])
+    worked = ' '.join(what_worked)
+    avoid = ' '.join(what_to_avoid)
+    if token_budget is not None:
+        fixed = count_tokens(_render_episodic_prompt("", "", "", "", procedural_memory))
+        parts = {"what_worked": worked, "what_to_avoid": avoid,
+                 "current_conversation": current_conversation, "previous_conversations": previous_convos}
+        allowances = allocate_budget(token_budget - fixed, [(name, count_tokens(text), None) for name, text in parts.items()])
+        worked, avoid, current_conversation, previous_convos = (
+            truncate_to_tokens(text, allowances[name]) for name, text in parts.items()
+        )
+    with span("episodic_system_prompt", budgeted=token_budget is not None) as sp:
+        content = _render_episodic_prompt(current_conversation, previous_convos, worked, avoid, procedural_memory)
+        if tracing.ENABLED:
+            sp.set_attributes({"prompt_tokens": count_tokens(content), "payload_bytes": payload_bytes(content)})
+    from langchain_core.messages import SystemMessage
+    return SystemMessage(content=content)
+
+def _render_episodic_prompt(current_conversation, previous_convos, worked, avoid, procedural_memory):
+    return f"""You are a helpful AI Assistant. Answer the user's questions to the best of your ability.
 You recall similar conversations with the user, here are the details:
 
 Current Conversation Match: {current_conversation}
-Previous Conversations: {' | '.join(previous_convos)}
-What has worked well: {' '.join(what_worked)}
-What to avoid: {' '.join(what_to_avoid)}
+Previous Conversations: {previous_convos}
+What has worked well: {worked}
+What to avoid: {avoid}
 
 Use these memories as context for your response to the user.
 
 Additionally, here are 10 guidelines for interactions with the current user: {procedural_memory}"""
-    return SystemMessage(content=episodic_prompt)
 
 def procedural_memory_update(what_worked, what_to_avoid):
     """
@@ -190,29 +412,161 @@ The final list should:
 
 Return only the list, no preamble or explanation.
 """
-    procedural_memory = llm.invoke(procedural_prompt)
-    with open("./procedural_memory.txt", "w") as content:
-        content.write(procedural_memory.content)
+    with span("procedural_memory_update"):
+        with span("llm.invoke", purpose="procedural") as sp:
+            if tracing.ENABLED:
+                sp.set_attribute("prompt_tokens", count_tokens(procedural_prompt))
+            procedural_memory = get_llm().invoke(procedural_prompt)
+        # Written to a temp file and swapped in, so a process killed mid-write (e.g. at exit,
+        # with the writer thread still running) never leaves the file truncated
+        tmp = "./procedural_memory.txt.tmp"
+        with open(tmp, "w") as content:
+            content.write(procedural_memory.content)
+            content.flush()
+            os.fsync(content.fileno())
+        os.replace(tmp, "./procedural_memory.txt")
+
+def _upsert_chunk_batch(rows, embed: bool = False):
+    """
+    Upsert one batch of chunk rows, skipping any whose chunk_hash is already stored.
+    With embed=True each row also gets an embedding, looked up through the embedding cache,
+    and chunks already stored without one have it filled in.
+    """
+    if embed:
+        for row, vector in zip(rows, embed_texts([row["chunk"] for row in rows])):
+            row["embedding"] = vector
+    store = get_store()
+    with span("db.upsert", table="crossfit_nutrition", rows=len(rows), backend=store.name) as sp:
+        if tracing.ENABLED:
+            sp.set_attribute("payload_bytes", payload_bytes(rows))
+        store.upsert_chunks(rows, update_embedding=embed)
+
+def _chunk_row(item):
+    """
+    Build a crossfit_nutrition row from either a chunk string or a chunk dict from
+    pdf_chunker.iter_pdf_chunks (which also carries page and byte offsets).
+    """
+    row = dict(item) if isinstance(item, dict) else {"chunk": item}
+    row["chunk_hash"] = chunk_hash(row["chunk"])
+    return row
+
+def load_pdf_chunks_to_db(recursive_character_chunks, batch_size: int = 200, max_in_flight: int = 4,
+                          embed: bool = False) -> list:
+    """
+    Load PDF chunks into the 'crossfit_nutrition' table and add them to the local BM25 index.
+    Chunks are sent as multi-row upserts keyed on a content hash, with up to max_in_flight
+    batches in flight at once, so re-running the load skips chunks that are already stored.
+    Accepts any iterable of chunk strings or chunk dicts, including the generator returned by
+    pdf_chunker.iter_pdf_chunks, and starts sending batches as soon as the first one is full.
+    With embed=True chunks are embedded on the way in; unchanged chunks are served from the
+    embedding cache, so re-running a load does no embedding work.
+    Returns the rows of any batches that failed to upsert (empty on success); those rows are
+    left out of the local indexes.
+    """
+    chunks = iter(recursive_character_chunks)
+    loaded, failed = [], []
+    rows_sent = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        pending = {}   # future -> the rows it is upserting
+        while True:
+            batch = list(islice(chunks, batch_size))
+            if not batch:
+                break
+            # Collapse duplicates within the batch; Postgres rejects an upsert that touches a key twice
+            rows = list({row["chunk_hash"]: row for row in map(_chunk_row, batch)}.values())
+            rows_sent += len(rows)
+            if len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                _check_batches({future: pending.pop(future) for future in done}, loaded, failed)
+            pending[pool.submit(_upsert_chunk_batch, rows, embed)] = rows
+        wait(pending)
+        _check_batches(pending, loaded, failed)
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {len(loaded)} chunks in {elapsed:.2f}s ({rows_sent / elapsed if elapsed else 0:.0f} rows/sec).")
+    if failed:
+        print(f"{len(failed)} of {rows_sent} chunks failed to load and were not indexed.")
+    if embed:
+        cache = get_embedding_cache()
+        cache.flush()
+        print("Embedding cache:", cache.stats())
+        # Rows were given their embedding by _upsert_chunk_batch
+        index = get_vector_index()
+        if index is not None:
+            index.add([row["chunk_hash"] for row in loaded], [row["chunk"] for row in loaded],
+                      [row.get("embedding") for row in loaded])
+            index.save()
+    build_lexical_index([row["chunk"] for row in loaded])
+    return failed
+
+def _check_batches(batches, loaded, failed):
+    """
+    Sorts the rows of finished upsert futures into loaded or failed.
+    """
+    for future, rows in batches.items():
+        try:
+            future.result()
+            loaded.extend(rows)
+        except Exception as e:
+            print("Error inserting chunk batch:", e)
+            failed.extend(rows)
 
-def load_pdf_chunks_to_db(recursive_character_chunks):
+def build_lexical_index(chunks):
     """
-    Load PDF chunks into the 'crossfit_nutrition' table.
+    Add chunks to the BM25 index (creating it if needed) and persist it to disk.
     """
-    for chunk in recursive_character_chunks:
-        response = supabase.table("crossfit_nutrition").insert({"chunk": chunk}).execute()
-        if not response.data:
-            print("Error inserting chunk. Response:", response)
+    global _lexical_index
+    index = get_lexical_index() or BM25Index()
+    index.add(chunks)
+    index.save(LEXICAL_INDEX_PATH)
+    _lexical_index = index
+    print(f"Lexical index saved with {len(index)} chunks.")
+
+def delete_chunks(chunk_hashes):
+    """
+    Delete chunks by content hash from the crossfit_nutrition table and the local BM25 index.
+    """
+    chunk_hashes = set(chunk_hashes)
+    if not chunk_hashes:
+        return
+    store = get_store()
+    with span("db.delete", table="crossfit_nutrition", rows=len(chunk_hashes), backend=store.name):
+        store.delete_chunks(sorted(chunk_hashes))
+    index = get_lexical_index()
+    if index is not None:
+        index.remove([chunk for chunk in index.docs if chunk is not None and chunk_hash(chunk) in chunk_hashes])
+        index.save(LEXICAL_INDEX_PATH)
+    vectors = get_vector_index()
+    if vectors is not None and vectors.remove(chunk_hashes):
+        vectors.save()
+    print(f"Deleted {len(chunk_hashes)} stale chunks.")
 
 def vectorized_semantic_search(query_vector: list, limit_count: int = 5):
     """
-    Perform a vectorized semantic search using pgvector. This function calls an RPC function
-    (named 'semantic_search') that must be created in your Supabase SQL editor.
+    Perform a vectorized semantic search over chunk embeddings. Uses the local quantized index
+    when one has been built (python vector_index.py); otherwise on Supabase this calls an RPC
+    function (named 'semantic_search') that must be created in your Supabase SQL editor.
+    """
+    index = get_vector_index()
+    with span("vector_search", k=limit_count, local=index is not None):
+        if index is not None:
+            results = index.search(query_vector, limit_count)
+        else:
+            results = get_store().vector_search(query_vector, limit_count)
+    if not results:
+        print("Vectorized semantic search returned no results.")
+    return results
+
+def vectorized_semantic_recall(query: str, limit_count: int = 5):
+    """
+    Embed the query (through the embedding cache) and run a vectorized semantic search, with
+    the same post-retrieval selection as semantic_recall_chunks applied to the results.
     """
-    response = supabase.rpc("semantic_search", {"query_vector": query_vector, "limit_count": limit_count}).execute()
-    if not response.data:
-        print("Error in vectorized semantic search. Response:", response)
-        return []
-    return response.data
+    results = vectorized_semantic_search(embed_query(query), limit_count * SEMANTIC_CANDIDATE_FACTOR)
+    with span("semantic_selection", k=limit_count, source="vector") as sp:
+        selected = _select(sp, [row["chunk"] for row in results], [row["similarity"] for row in results],
+                           limit_count, VECTOR_MIN_SCORE_RATIO)
+    return [results[i] for i in selected]
 
 def ensure_table_exists():
     """
@@ -229,5 +583,77 @@ def ensure_table_exists():
         created_at TIMESTAMPTZ DEFAULT NOW()
     );
     """
-    response = supabase.rpc("sql", {"sql": sql}).execute()
-    print("Table check complete. Episodic memory table is ready.")
\ No newline at end of file
+    response = get_supabase().rpc("sql", {"sql": sql}).execute()
+    print("Table check complete. Episodic memory table is ready.")
+
+def ensure_nutrition_table_exists():
+    """
+    Creates the crossfit_nutrition table if it does not exist, with a unique content hash
+    so chunk loads can be upserted.
+    """
+    sql = f"""
+    CREATE TABLE IF NOT EXISTS crossfit_nutrition (
+        id SERIAL PRIMARY KEY,
+        chunk TEXT NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT NOW()
+    );
+    ALTER TABLE crossfit_nutrition ADD COLUMN IF NOT EXISTS chunk_hash TEXT;
+    ALTER TABLE crossfit_nutrition ADD COLUMN IF NOT EXISTS source TEXT;
+    ALTER TABLE crossfit_nutrition ADD COLUMN IF NOT EXISTS page INTEGER;
+    ALTER TABLE crossfit_nutrition ADD COLUMN IF NOT EXISTS start_byte BIGINT;
+    ALTER TABLE crossfit_nutrition ADD COLUMN IF NOT EXISTS end_byte BIGINT;
+    ALTER TABLE crossfit_nutrition ADD COLUMN IF NOT EXISTS embedding vector({EMBEDDING_DIM});
+    CREATE UNIQUE INDEX IF NOT EXISTS crossfit_nutrition_chunk_hash_idx ON crossfit_nutrition (chunk_hash);
+    """
+    response = get_supabase().rpc("sql", {"sql": sql}).execute()
+    print("Table check complete. Crossfit nutrition table is ready.")
+
+def ensure_episodic_search_index():
+    """
+    Adds a full-text search column and GIN index over conversation_summary and context_tags,
+    creates the match_episodic_memory RPC used by episodic_recall, and adds the MinHash
+    columns used for near-duplicate detection.
+    """
+    sql = """
+    CREATE OR REPLACE FUNCTION episodic_search_text(summary TEXT, tags TEXT[])
+    RETURNS TEXT LANGUAGE sql IMMUTABLE AS $$
+        SELECT coalesce(summary, '') || ' ' || replace(coalesce(array_to_string(tags, ' '), ''), '_', ' ')
+    $$;
+
+    ALTER TABLE episodic_memory ADD COLUMN IF NOT EXISTS search_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', episodic_search_text(conversation_summary, context_tags))) STORED;
+    CREATE INDEX IF NOT EXISTS episodic_memory_search_idx ON episodic_memory USING GIN (search_tsv);
+    CREATE INDEX IF NOT EXISTS episodic_memory_created_at_idx ON episodic_memory (created_at DESC);
+    ALTER TABLE episodic_memory ADD COLUMN IF NOT EXISTS transcript_minhash BIGINT[];
+    ALTER TABLE episodic_memory ADD COLUMN IF NOT EXISTS summary_minhash BIGINT[];
+
+    CREATE OR REPLACE FUNCTION match_episodic_memory(
+        query_text TEXT,
+        match_count INT DEFAULT 3,
+        recency_half_life_days FLOAT DEFAULT 30
+    )
+    RETURNS TABLE (
+        id INT,
+        conversation TEXT,
+        conversation_summary TEXT,
+        what_worked TEXT,
+        what_to_avoid TEXT,
+        created_at TIMESTAMPTZ,
+        score FLOAT
+    )
+    LANGUAGE sql STABLE AS $$
+        -- Match any query term (OR) rather than all of them, so natural-language questions hit
+        WITH q AS (
+            SELECT to_tsquery('english', replace(plainto_tsquery('english', query_text)::text, ' & ', ' | ')) AS tsq
+        )
+        SELECT m.id, m.conversation, m.conversation_summary, m.what_worked, m.what_to_avoid, m.created_at,
+               ts_rank_cd(m.search_tsv, q.tsq)
+                 * (0.5 + 0.5 * exp(-extract(epoch FROM now() - m.created_at) / 86400.0 / recency_half_life_days)) AS score
+        FROM episodic_memory m, q
+        WHERE m.search_tsv @@ q.tsq
+        ORDER BY score DESC
+        LIMIT match_count
+    $$;
+    """
+    response = get_supabase().rpc("sql", {"sql": sql}).execute()
+    print("Episodic search index is ready.")
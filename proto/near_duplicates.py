@@ -0,0 +1,151 @@
+# near_duplicates.py
+import hashlib
+import re
+
+import numpy as np
+
+NUM_PERM = 64
+_MASK32 = np.uint64(0xFFFFFFFF)
+# Fixed odd multipliers and offsets. They are written out rather than drawn from a seeded
+# generator, because NumPy doesn't promise the same stream across versions and stored
+# *_minhash columns must keep matching. (Originally drawn from default_rng(20250201).)
+_A = np.array([
+    0x414f2b958233b547, 0x37dc33edb6970ee5, 0x345987730300b245, 0x0047f195a26ce385,
+    0x52ae74259509ea5d, 0x44be3eb1d098dc7f, 0x015be2eac9d73217, 0x3a61fccfa089ec45,
+    0x06d5d3dfd844dabd, 0x4a88ccc8e57f5e6d, 0x374f3ffa75de3379, 0x1a94fd0350815f41,
+    0x068bfd4adb3a19f3, 0x39f72e1fdd93f88f, 0x09f6433dddb83da3, 0x1ad56db59c3d7505,
+    0x775fc9e5455a5e75, 0x67a07cba6604b81b, 0x6a929d96e9d40ebf, 0x53d9cd47957b46f5,
+    0x7b5d3a31c794db0d, 0x2913e3c4def162a9, 0x4b4e13607f37dc15, 0x32fadde75caadb5b,
+    0x767a49673abe8789, 0x00198843aec84c15, 0x16e63150628411af, 0x580260d4e1e45dbd,
+    0x2c11996c79108e89, 0x235e1960911b213d, 0x75dcbac86ecf53cd, 0x31111038ca98b7dd,
+    0x3fb71eb309757121, 0x2786750eb33fa0e7, 0x7e3b7291c2d8b853, 0x28447bc6c0283949,
+    0x5cff9146632951f1, 0x011226ee3db27605, 0x10211a9c02874bcb, 0x1af6987a7c558de3,
+    0x088304bf2a372ddf, 0x5052300ffc61087b, 0x3c8ee93ce516cc1f, 0x6878d0b599f00a07,
+    0x2cce82c1e2b2bd4b, 0x70a0cd18f1b3d86d, 0x1b8109d0c8f9ce1d, 0x3efd710a2539fa73,
+    0x1c4bdfb0a11bc8d7, 0x476f0216512f55d9, 0x7b61a2ccaa463da1, 0x33cf135df19ac973,
+    0x1c4ff36c23bde4b1, 0x14dea3bebde54107, 0x543fb81dfe4ef68b, 0x1912b84de963a71d,
+    0x44b496660734a877, 0x41f807d5a9960eb1, 0x72769ac146fd187b, 0x57fd809a90ac2ff7,
+    0x22f0c0bba168622d, 0x104d67174859c739, 0x71eaae1c626d19ad, 0x6a739ef49cc3bc0d,
+], dtype=np.uint64)
+_B = np.array([
+    0x08e482fea8988d7c, 0x2629e77615c0c034, 0x71a3d0e155ba92b8, 0x2b6eee001ce5890b,
+    0x46b0ff325c078510, 0x44b3f7fa3fbe03fb, 0x508206f7cc81793f, 0x68b06eb28dc93dc1,
+    0x5df115bbcf6025f5, 0x1c3ce2b07783d530, 0x6f2f63bf8255b7cf, 0x30c11c44c59b7b10,
+    0x0e68d1f73debfecc, 0x27c8d2936e93b58b, 0x3d375e34f1a44905, 0x5486babd2323616e,
+    0x5acc95a8b839cb6c, 0x055900be41372d1c, 0x411da3db50418b84, 0x22ddcb457b264bc6,
+    0x095b9241b9e9181d, 0x74d24b5233aa4304, 0x2b7b8c0dabf34008, 0x5f6183a06a07c373,
+    0x58f96941002b83b5, 0x4339d352286bf266, 0x1a9781b564f791d0, 0x183eb8b81540f646,
+    0x12c7a2e2183a4659, 0x54707cdcaaed65f5, 0x06dd80dedace8fac, 0x2189b791090702c4,
+    0x23ed082c9e3b143f, 0x3612a4010cc56f08, 0x0a978db8a1421ffb, 0x3a5c65d7828560bb,
+    0x3731767dd1c9468b, 0x79866e7951e72915, 0x5ab71e4ac5364dba, 0x271cf6997f18d58e,
+    0x16da5a0fbe9e5050, 0x4f33b4ec4d0f927e, 0x6b62a9c759282479, 0x46210001ce0fd42b,
+    0x43d6037b9ca5123d, 0x4b2bfb2d70eb4713, 0x3bab135f6854a349, 0x66d1a4f6204e1cb0,
+    0x6564de913488bdf8, 0x285e83846ae66b0e, 0x5d8395ec20636799, 0x75699e548132f9e9,
+    0x6e9941a9e77f0ece, 0x288102be5aa55e9d, 0x49bd5105a1b55809, 0x56b9397466d09d36,
+    0x5fde27d054b914b2, 0x291d1f05bedc89a8, 0x16b31675f42ccf2a, 0x4f9732be561994e2,
+    0x55227f477da4d6a1, 0x704b683d0c7f63f4, 0x786c9d47ca564977, 0x3e484686a54a8c93,
+], dtype=np.uint64)
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Texts with fewer shingles than this (about ten words) get no signature: short or "N/A" text
+# would otherwise match any other short text at similarity 1.0
+MIN_SHINGLES = 8
+
+def shingles(text: str, size: int = 3) -> np.ndarray:
+    """
+    Hashes of the overlapping size-word shingles of text, as uint64.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        grams = {" ".join(words)} if words else set()
+    else:
+        grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "little") for g in grams],
+        dtype=np.uint64,
+    )
+
+def minhash(text: str, min_shingles: int = MIN_SHINGLES) -> list:
+    """
+    MinHash signature (NUM_PERM 32-bit values) of text's word shingles. The fraction of equal
+    positions between two signatures estimates the Jaccard similarity of their shingle sets.
+    Returns None for text with fewer than min_shingles shingles, which never counts as a duplicate.
+    """
+    hashes = shingles(text or "")
+    if hashes.size == 0 or hashes.size < min_shingles:
+        return None
+    # Multiply-shift hashing in wrapping uint64 arithmetic, one row per permutation
+    with np.errstate(over="ignore"):
+        permuted = (np.outer(_A, hashes) + _B[:, None]) >> np.uint64(32)
+    return (permuted & _MASK32).min(axis=1).astype(np.int64).tolist()
+
+def similarity(sig_a, sig_b) -> float:
+    """
+    Estimated Jaccard similarity of two signatures.
+    """
+    if not sig_a or not sig_b:
+        return 0.0
+    return float(np.mean(np.asarray(sig_a) == np.asarray(sig_b)))
+
+class LSHIndex:
+    """
+    Banded locality-sensitive hash index over MinHash signatures. With 16 bands of 4 rows,
+    pairs above ~0.6 similarity are almost always candidates and pairs below ~0.3 rarely are.
+    """
+
+    def __init__(self, bands: int = 16, max_items: int = None):
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.max_items = max_items
+        self._buckets = [dict() for _ in range(bands)]
+        self._signatures = {}   # key -> signature, in insertion order
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _band_keys(self, signature):
+        return [tuple(signature[b * self.rows:(b + 1) * self.rows]) for b in range(self.bands)]
+
+    def add(self, key, signature):
+        if not signature or key in self._signatures:
+            return
+        self._signatures[key] = signature
+        for bucket, band in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(band, set()).add(key)
+        if self.max_items is not None and len(self._signatures) > self.max_items:
+            self.remove(next(iter(self._signatures)))
+
+    def remove(self, key):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for bucket, band in zip(self._buckets, self._band_keys(signature)):
+            keys = bucket.get(band)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del bucket[band]
+
+    def candidates(self, signature) -> set:
+        """
+        Keys sharing at least one band with signature: the only ones worth comparing it to.
+        """
+        if not signature:
+            return set()
+        keys = set()
+        for bucket, band in zip(self._buckets, self._band_keys(signature)):
+            keys |= bucket.get(band, set())
+        return keys
+
+    def best_match(self, signature, threshold: float):
+        """
+        Returns (key, similarity) of the most similar indexed signature at or above threshold,
+        or None.
+        """
+        best = None
+        for key in self.candidates(signature):
+            score = similarity(signature, self._signatures[key])
+            if score >= threshold and (best is None or score > best[1]):
+                best = (key, score)
+        return best
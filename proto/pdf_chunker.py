@@ -1,11 +1,13 @@
 # pdf_chunker.py
-from langchain_community.document_loaders import PyPDFLoader
-from chunking_evaluation.chunking import RecursiveTokenChunker
+# The PDF loader and reference chunker are imported inside the functions that use them,
+# so importing this module (e.g. to start ingest workers) stays cheap.
 
 def load_pdf_chunks(pdf_path: str, chunk_size: int = 800, chunk_overlap: int = 0) -> list:
     """
     Loads a PDF and splits its text into chunks.
     """
+    from langchain_community.document_loaders import PyPDFLoader
+    from chunking_evaluation.chunking import RecursiveTokenChunker
     loader = PyPDFLoader(pdf_path)
     pages = loader.load()
     # Combine all page contents into one string
@@ -18,3 +20,115 @@ def load_pdf_chunks(pdf_path: str, chunk_size: int = 800, chunk_overlap: int = 0
     )
     chunks = recursive_character_chunker.split_text(document)
     return chunks
+
+STREAM_SEPARATORS = ["\n\n", "\n", ".", "?", "!", " "]
+
+def _find_cut(text: str, chunk_size: int, separators: list) -> int:
+    """
+    Returns the end index of the next chunk: just after the last separator (in priority order)
+    that falls inside the first chunk_size characters, or chunk_size if there is none.
+    """
+    window = text[:chunk_size]
+    for sep in separators:
+        idx = window.rfind(sep)
+        if idx > 0:
+            return idx + len(sep)
+    return len(window)
+
+def split_text(text: str, chunk_size: int = 800, chunk_overlap: int = 0, separators: list = None) -> list:
+    """
+    Splits a single string (e.g. one page) into whitespace-trimmed chunks of at most chunk_size
+    characters, cutting at separators the same way iter_pdf_chunks does.
+    """
+    separators = separators or STREAM_SEPARATORS
+    chunks = []
+    while text:
+        cut = _find_cut(text, chunk_size, separators) if len(text) > chunk_size else len(text)
+        if text[:cut].strip():
+            chunks.append(text[:cut].strip())
+        if cut == len(text):
+            break
+        text = text[cut - chunk_overlap if cut > chunk_overlap else cut:]
+    return chunks
+
+def iter_pdf_chunks(pdf_path: str, chunk_size: int = 800, chunk_overlap: int = 0, separators: list = None):
+    """
+    Streams a PDF page by page and yields chunks as dicts with the chunk text, the (1-based) page
+    the chunk starts on, and its start/end byte offsets in the UTF-8 text of the whole document.
+    Only the current page plus a carry-over window of at most chunk_size characters is held in
+    memory, so callers can start inserting chunks before the document has been fully parsed.
+    """
+    from langchain_community.document_loaders import PyPDFLoader
+    separators = separators or STREAM_SEPARATORS
+    loader = PyPDFLoader(pdf_path)
+    buffer = ""
+    buffer_byte = 0   # byte offset of buffer[0] within the document
+    page_marks = []   # (index into buffer, page number) where each buffered page begins
+
+    def emit(final: bool):
+        nonlocal buffer, buffer_byte, page_marks
+        while buffer and (final or len(buffer) > chunk_size):
+            # A final tail that already fits is one chunk, as in split_text
+            cut = _find_cut(buffer, chunk_size, separators) if len(buffer) > chunk_size else len(buffer)
+            piece = buffer[:cut]
+            page = [p for i, p in page_marks if i == 0][-1]
+            start_byte = buffer_byte
+            end_byte = start_byte + len(piece.encode("utf-8"))
+            if piece.strip():
+                yield {"chunk": piece.strip(), "page": page, "start_byte": start_byte, "end_byte": end_byte}
+            if final and cut == len(buffer):
+                buffer = ""
+                break
+            # Step back by the overlap, but always make progress
+            step = cut - chunk_overlap if cut > chunk_overlap else cut
+            buffer_byte += len(buffer[:step].encode("utf-8"))
+            buffer = buffer[step:]
+            current = [p for i, p in page_marks if i <= step][-1]
+            page_marks = [(0, current)] + [(i - step, p) for i, p in page_marks if i > step]
+
+    for page_number, page in enumerate(loader.lazy_load(), start=1):
+        text = page.page_content
+        if buffer:
+            # Pages are joined with a single space, matching load_pdf_chunks
+            buffer += " "
+        elif page_marks:
+            buffer_byte += 1
+        page_marks.append((len(buffer), page_number))
+        buffer += text
+        yield from emit(final=False)
+    if page_marks:
+        yield from emit(final=True)
+
+def iter_pdf_token_chunks(pdf_path: str, chunk_tokens: int = 200, overlap_tokens: int = 0, model: str = "gpt-4o"):
+    """
+    Like iter_pdf_chunks, but chunk size and overlap are measured in model tokens (see
+    token_chunker.py). The document is tokenized as a whole, so it is parsed before the first
+    chunk is yielded. Yields the same dicts: chunk text, starting page, and byte offsets.
+    """
+    from bisect import bisect_right
+    from langchain_community.document_loaders import PyPDFLoader
+    from token_chunker import token_chunk_spans
+
+    page_starts, parts, length = [], [], 0
+    for page in PyPDFLoader(pdf_path).lazy_load():
+        if parts:
+            # Pages are joined with a single space, matching load_pdf_chunks
+            parts.append(" ")
+            length += 1
+        page_starts.append(length)
+        parts.append(page.page_content)
+        length += len(page.page_content)
+    document = "".join(parts)
+
+    spans = token_chunk_spans(document, chunk_tokens, overlap_tokens, model)
+    # Byte offsets of every span edge, accumulated in one forward walk over the document
+    byte_at = {}
+    position = byte = 0
+    for edge in sorted({edge for start, end, _ in spans for edge in (start, end)}):
+        byte += len(document[position:edge].encode("utf-8"))
+        byte_at[edge] = byte
+        position = edge
+    for start, end, _ in spans:
+        piece = document[start:end].strip()
+        if piece:
+            yield {"chunk": piece, "page": bisect_right(page_starts, start), "start_byte": byte_at[start], "end_byte": byte_at[end]}
@@ -1,7 +1,9 @@
 # prompts.py
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
-from config import llm  # Import the LLM instance
+import json
+# LangChain and the LLM client are imported when a chain is first built, not at import time
+from config import get_llm
+from llm_cache import cached_json, fingerprint
+from tracing import span
 
 reflection_prompt_template = """
 You are analyzing conversations about personal fitness, nutrition guidance, health data, and user preferences to create memories that will help guide future interactions. Your task is to extract key elements that would be most helpful when encountering similar personal training or nutrition discussions in the future.
@@ -55,12 +57,124 @@ Here is the prior conversation:
 {conversation}
 """
 
-# Create the prompt and reflection pipeline
-reflection_prompt = ChatPromptTemplate.from_template(reflection_prompt_template)
-reflect = reflection_prompt | llm | JsonOutputParser()
+# Changes whenever the template does, so cached reflections from an older prompt aren't reused
+REFLECTION_VERSION = fingerprint(reflection_prompt_template)[:8]
+
+# Reflection and summary chains, built on first use (assign these to substitute another model)
+reflect = None
+summarize = None
+
+def get_reflect():
+    """
+    Returns the reflection chain (prompt | llm | JSON parser), building it on first use.
+    """
+    global reflect
+    if reflect is None:
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import JsonOutputParser
+        reflect = ChatPromptTemplate.from_template(reflection_prompt_template) | get_llm() | JsonOutputParser()
+    return reflect
+
+def reflection_cache_namespace() -> str:
+    """
+    Cache namespace for reflections from the current model and reflection template.
+    """
+    return f"reflection:{get_llm().model_name}:{REFLECTION_VERSION}"
 
 def create_reflection(conversation: str) -> dict:
     """
     Generates a reflection from the provided conversation text.
+    Results are cached, so reflecting on the same transcript again costs no LLM call.
+    """
+    with span("create_reflection", conversation_bytes=len(conversation.encode("utf-8"))):
+        return cached_json(reflection_cache_namespace(), conversation,
+                           lambda text: get_reflect().invoke({"conversation": text}))
+
+summary_prompt_template = """
+You are keeping a running summary of a conversation between a user and their AI personal trainer and nutrition coach, so the assistant can keep the context of earlier turns without rereading them.
+
+Update the summary below with the new turns. Keep every fact the assistant will need later: the user's goals, body metrics, preferences, restrictions, injuries, plans agreed on and open questions. Drop pleasantries and repetition. Write plain prose of no more than 200 words.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW TURNS:
+{turns}
+
+Return only the updated summary.
+"""
+
+def get_summarize():
+    """
+    Returns the running-summary chain (prompt | llm | string parser), building it on first use.
+    """
+    global summarize
+    if summarize is None:
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import StrOutputParser
+        summarize = ChatPromptTemplate.from_template(summary_prompt_template) | get_llm() | StrOutputParser()
+    return summarize
+
+async def update_summary(summary: str, turns: str) -> str:
+    """
+    Folds newly formatted conversation turns into a running summary.
+    """
+    return await get_summarize().ainvoke({"summary": summary or "N/A", "turns": turns})
+
+reflection_update_prompt_template = """
+You are maintaining a running memory reflection on an ongoing conversation about personal fitness, nutrition guidance, health data, and user preferences. The reflection below covers the conversation so far; update it with the new turns.
+
+Follow the same rules as when the reflection was first written:
+1. For any field where you don't have enough information or the field isn't relevant, use "N/A"
+2. Be extremely concise - each string should be one clear, actionable sentence
+3. Keep context_tags from the current reflection that still apply and add tags for new topics
+4. The conversation_summary, what_worked and what_to_avoid must describe the whole conversation, not only the new turns
+
+Output valid JSON in exactly the same format as the current reflection:
+{{
+    "context_tags": [
+        string,
+        ...
+    ],
+    "conversation_summary": string,
+    "what_worked": string,
+    "what_to_avoid": string
+}}
+
+Do not include any text outside the JSON object in your response.
+
+CURRENT REFLECTION:
+{reflection}
+
+NEW TURNS:
+{turns}
+"""
+
+reflect_update = None
+
+def get_reflect_update():
+    """
+    Returns the chain that merges new turns into a running reflection, building it on first use.
+    """
+    global reflect_update
+    if reflect_update is None:
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import JsonOutputParser
+        reflect_update = ChatPromptTemplate.from_template(reflection_update_prompt_template) | get_llm() | JsonOutputParser()
+    return reflect_update
+
+def update_reflection(reflection: dict, turns: str) -> dict:
+    """
+    Merges newly formatted conversation turns into a running reflection.
+    """
+    with span("update_reflection", turns_bytes=len(turns.encode("utf-8"))):
+        return get_reflect_update().invoke({"reflection": json.dumps(reflection, indent=2), "turns": turns})
+
+async def aupdate_reflection(reflection: dict, turns: str) -> dict:
+    """
+    Async update_reflection; with no running reflection yet, reflects on the turns from scratch.
     """
-    return reflect.invoke({"conversation": conversation})
+    with span("update_reflection", turns_bytes=len(turns.encode("utf-8"))):
+        if reflection is None:
+            return await get_reflect().ainvoke({"conversation": turns})
+        return await get_reflect_update().ainvoke({"reflection": json.dumps(reflection, indent=2), "turns": turns})
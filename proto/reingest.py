@@ -0,0 +1,185 @@
+# reingest.py
+"""
+Incremental re-ingestion of revised PDFs.
+
+    python reingest.py docs/ --unit tokens --chunk-size 200 --embed
+
+A JSON manifest (INGEST_MANIFEST_PATH) records, for every source document, a hash of each
+page's content stream and the hashes of the chunks cut from that page. On a re-run only the
+pages whose hash changed have their text extracted, chunked, embedded and upserted; chunks
+that are no longer produced by any page of any document are deleted from crossfit_nutrition
+and the BM25 index in one bulk delete. A one-page correction to a large handbook costs one
+page of work.
+
+Chunks are cut page by page here, so no chunk spans a page break (unlike ingest.py, which
+chunks the joined document); that is what lets a page be re-chunked on its own. Changing the
+chunking settings re-chunks every page. The first time a document is seen, any rows already
+stored under its file name (e.g. by ingest.py) that no manifest entry accounts for are
+treated as stale, so its old cross-page chunks are replaced rather than kept alongside.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from config import INGEST_MANIFEST_PATH
+from helpers import chunk_hash
+from ingest import find_pdfs
+
+MANIFEST_VERSION = 2
+
+def load_manifest(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"version": MANIFEST_VERSION, "sources": {}}
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        print("Ingestion manifest format changed; every page will be re-ingested.")
+        # Old chunk hashes are carried over so chunks the re-ingest no longer produces still get deleted
+        return {"version": MANIFEST_VERSION, "sources": {}, "previous_chunks": sorted(_chunk_hashes(manifest["sources"]))}
+    return manifest
+
+def save_manifest(path: str, manifest: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+def page_hash(page) -> str:
+    """
+    Hashes a pypdf page's raw content stream, which is much cheaper than extracting its text.
+    """
+    contents = page.get_contents()
+    return hashlib.sha256(contents.get_data() if contents is not None else b"").hexdigest()
+
+def chunk_page(text: str, chunk_size: int, chunk_overlap: int, unit: str) -> list:
+    if unit == "tokens":
+        from token_chunker import split_text_by_tokens
+        return split_text_by_tokens(text, chunk_size, chunk_overlap)
+    from pdf_chunker import split_text
+    return split_text(text, chunk_size, chunk_overlap)
+
+def diff_pdf(path: str, entry: dict, settings: str, chunk_size: int, chunk_overlap: int, unit: str) -> tuple:
+    """
+    Compares a PDF against its manifest entry. Returns (updated entry, chunk dicts for the
+    changed pages, number of changed pages); unchanged pages are never extracted or chunked.
+    """
+    from pypdf import PdfReader
+
+    source = os.path.basename(path)
+    old_pages = entry.get("pages", {}) if entry.get("settings") == settings else {}
+    pages, chunks, changed = {}, [], 0
+    for page_number, page in enumerate(PdfReader(path).pages, start=1):
+        key = str(page_number)
+        digest = page_hash(page)
+        if key in old_pages and old_pages[key]["hash"] == digest:
+            pages[key] = old_pages[key]
+            continue
+        changed += 1
+        page_chunks = chunk_page(page.extract_text(), chunk_size, chunk_overlap, unit)
+        pages[key] = {"hash": digest, "chunks": [chunk_hash(chunk) for chunk in page_chunks]}
+        chunks.extend({"chunk": chunk, "page": page_number, "source": source} for chunk in page_chunks)
+    return {"settings": settings, "pages": pages}, chunks, changed
+
+def source_key(path: str) -> str:
+    """
+    Manifest key for a PDF: its absolute, symlink-resolved path, so files with the same name
+    in different directories keep separate entries.
+    """
+    return os.path.realpath(path)
+
+def _chunk_hashes(sources: dict) -> set:
+    return {h for entry in sources.values() for page in entry["pages"].values() for h in page["chunks"]}
+
+def _mark_failed_pages(sources: dict, previous: dict, failed_hashes: set) -> int:
+    """
+    For each re-chunked page with a chunk that failed to load, clears the page hash so the page
+    is redone on the next run, and keeps its old chunk hashes alongside the new ones so neither
+    is deleted as stale in the meantime. Returns the number of pages marked.
+    """
+    marked = 0
+    if not failed_hashes:
+        return marked
+    for source, old_pages in previous.items():
+        for key, page in sources[source]["pages"].items():
+            if page is not old_pages.get(key) and failed_hashes.intersection(page["chunks"]):
+                old_chunks = old_pages.get(key, {}).get("chunks", [])
+                sources[source]["pages"][key] = {"hash": None, "chunks": sorted(set(old_chunks) | set(page["chunks"]))}
+                marked += 1
+    return marked
+
+def reingest(paths, chunk_size: int = 800, chunk_overlap: int = 0, unit: str = "chars", embed: bool = False,
+             prune: bool = False, manifest_path: str = INGEST_MANIFEST_PATH, batch_size: int = 200,
+             max_in_flight: int = 4) -> dict:
+    """
+    Brings crossfit_nutrition and the BM25 index in line with the PDFs under paths, touching only
+    pages that changed since the last run. With prune=True, documents in the manifest that are
+    no longer under paths have all their chunks removed. Returns a per-file summary dict.
+    """
+    from memory_manager import load_pdf_chunks_to_db, delete_chunks
+    from storage import get_store
+
+    manifest = load_manifest(manifest_path)
+    sources = manifest["sources"]
+    before = _chunk_hashes(sources) | set(manifest.pop("previous_chunks", []))
+    settings = f"{unit}:{chunk_size}:{chunk_overlap}"
+    start = time.perf_counter()
+
+    results, new_chunks, previous = {}, [], {}
+    tracked = set(before)
+    pdfs = find_pdfs(paths)
+    for path in pdfs:
+        source = source_key(path)
+        if source not in sources:
+            # Rows loaded outside reingest carry only the file name, which another tracked
+            # document may share, so only hashes no manifest entry knows about are taken over
+            before |= set(get_store().source_chunk_hashes(os.path.basename(path))) - tracked
+        try:
+            entry, chunks, changed = diff_pdf(path, sources.get(source, {}), settings, chunk_size, chunk_overlap, unit)
+        except Exception as e:
+            # Keep the old entry so a file that fails to parse doesn't have its chunks deleted
+            results[path] = {"pages": 0, "changed": 0, "chunks": 0, "error": f"{type(e).__name__}: {e}"}
+            print(f"{path}: FAILED ({results[path]['error']})")
+            continue
+        previous[source] = sources.get(source, {}).get("pages", {})
+        sources[source] = entry
+        new_chunks.extend(chunks)
+        results[path] = {"pages": len(entry["pages"]), "changed": changed, "chunks": len(chunks), "error": None}
+        print(f"{path}: {changed}/{len(entry['pages'])} pages changed, {len(chunks)} chunks")
+    if prune:
+        seen = {source_key(path) for path in pdfs}
+        for source in [s for s in sources if s not in seen]:
+            print(f"{source}: no longer present, removing")
+            del sources[source]
+
+    failed = load_pdf_chunks_to_db(new_chunks, batch_size=batch_size, max_in_flight=max_in_flight, embed=embed) \
+        if new_chunks else []
+    retry = _mark_failed_pages(sources, previous, {row["chunk_hash"] for row in failed})
+    # A chunk is stale only if no page anywhere still produces it (chunk_hash is unique across sources)
+    stale = before - _chunk_hashes(sources)
+    delete_chunks(stale)
+    save_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - start
+    changed = sum(r["changed"] for r in results.values())
+    total = sum(r["pages"] for r in results.values())
+    print(f"Re-ingested {changed}/{total} pages in {elapsed:.2f}s: {len(new_chunks) - len(failed)} chunks upserted, "
+          f"{len(stale)} deleted.")
+    if retry:
+        print(f"{retry} page(s) had chunks that failed to load; they will be retried on the next run.")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-ingest only the PDF pages that changed since the last run.")
+    parser.add_argument("paths", nargs="+", help="PDF files or directories to ingest")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=0)
+    parser.add_argument("--unit", choices=("chars", "tokens"), default="chars",
+                        help="measure --chunk-size/--chunk-overlap in characters or model tokens")
+    parser.add_argument("--embed", action="store_true", help="embed changed chunks on the way in")
+    parser.add_argument("--prune", action="store_true",
+                        help="delete chunks of documents in the manifest that are not under paths")
+    parser.add_argument("--manifest", default=INGEST_MANIFEST_PATH)
+    args = parser.parse_args()
+    reingest(args.paths, args.chunk_size, args.chunk_overlap, args.unit, args.embed, args.prune, args.manifest)
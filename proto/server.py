@@ -0,0 +1,252 @@
+# server.py
+"""
+Async HTTP chat service hosting the trainer pipeline for many concurrent sessions.
+
+    uvicorn server:app --host 0.0.0.0 --port 8000
+
+    POST   /sessions                     -> {"session_id": ...}
+    POST   /sessions/{id}/messages       {"message": "..."} -> streamed reply (text/plain)
+    POST   /sessions/{id}/end            queue the session for episodic and procedural memory
+    DELETE /sessions/{id}                drop the session without storing it
+    GET    /health                       session and cache counters
+
+All sessions share the process-wide Supabase client, BM25 index, LLM response cache and
+episodic writer. Recall runs on a bounded thread pool and replies are limited to
+LLM_CONCURRENCY in-flight model calls; sessions idle longer than SESSION_IDLE_TTL, or the
+least recently used ones beyond MAX_SESSIONS, are evicted and stored as if they had ended.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import HumanMessage, AIMessage
+from pydantic import BaseModel
+
+from config import (
+    MAX_SESSIONS, SESSION_IDLE_TTL, LLM_CONCURRENCY, RECALL_WORKERS, HISTORY_KEEP_TURNS, REFLECT_EVERY_TURNS
+)
+from episodic_writer import get_episodic_writer
+from helpers import format_conversation
+from history import ConversationHistory, RunningReflection
+from llm_cache import get_cached_llm, get_llm_cache, fingerprint
+from memory_manager import get_lexical_index, semantic_selection_stats
+from tracing import span
+from trainer import gather_turn_context
+
+logger = logging.getLogger(__name__)
+
+class Session:
+    """
+    Per-session state that trainer_memory_async keeps in local variables.
+    """
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.conversations = []
+        self.what_worked = set()
+        self.what_to_avoid = set()
+        self.history = ConversationHistory(keep_turns=HISTORY_KEEP_TURNS, llm_slot=llm_slot)
+        self.reflection = RunningReflection(self.history.transcript, every_turns=REFLECT_EVERY_TURNS,
+                                            llm_slot=llm_slot)
+        self.system_prompt = None
+        self.last_seen = time.monotonic()
+        self.lock = asyncio.Lock()   # turns within one session run one at a time
+
+    async def finish(self):
+        """
+        Queues the session for reflection, episodic storage and the procedural update. The
+        snapshot cancels the running reflection's loop task, so it is taken on the event loop;
+        only the spool write, which fsyncs, runs on a worker thread.
+        """
+        if self.history.transcript:
+            messages = [self.system_prompt] + self.history.transcript
+            running, unreflected = self.reflection.snapshot()
+            await asyncio.to_thread(get_episodic_writer().submit, format_conversation(messages),
+                                    self.what_worked, self.what_to_avoid, reflection=running, unreflected=unreflected)
+
+class SessionStore:
+    """
+    Bounded LRU store of live sessions. Sessions past idle_ttl or beyond max_sessions are
+    evicted and finished, so their conversations still reach episodic memory.
+    """
+
+    def __init__(self, max_sessions: int = 1000, idle_ttl: float = 1800):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()
+        self._to_finish = []   # evicted sessions waiting for finish_evicted()
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self) -> Session:
+        session = Session(uuid.uuid4().hex)
+        self._sessions[session.id] = session
+        while len(self._sessions) > self.max_sessions:
+            # Least recently used first, skipping sessions mid-turn so their turn isn't lost
+            victim = next((s for s in self._sessions.values() if s is not session and not s.lock.locked()), None)
+            if victim is None:
+                break   # every other session is mid-turn; stay over the bound until one finishes
+            del self._sessions[victim.id]
+            self._evict(victim)
+        return session
+
+    def get(self, session_id: str) -> Session:
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired session")
+        session.last_seen = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def pop(self, session_id: str) -> Session:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired session")
+        return session
+
+    def expire_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        # Least recently used first, so stop at the first session still in use
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.last_seen > cutoff or session.lock.locked():
+                break
+            del self._sessions[session.id]
+            self._evict(session)
+
+    async def finish_all(self):
+        while self._sessions:
+            _, session = self._sessions.popitem(last=False)
+            await session.finish()
+
+    async def finish_evicted(self):
+        """
+        Finishes sessions evicted since the last call.
+        """
+        while self._to_finish:
+            session = self._to_finish.pop()
+            try:
+                await session.finish()
+            except Exception as e:
+                logger.warning("Could not store evicted session %s: %s", session.id, e)
+
+    def _evict(self, session: Session):
+        self.evicted += 1
+        self._to_finish.append(session)
+
+store = SessionStore(MAX_SESSIONS, SESSION_IDLE_TTL)
+llm_slots = asyncio.Semaphore(LLM_CONCURRENCY)
+llm_in_flight = 0
+
+@asynccontextmanager
+async def llm_slot():
+    """
+    Holds one of the LLM_CONCURRENCY slots for a model call: replies, and each session's
+    background history summaries and running reflections.
+    """
+    global llm_in_flight
+    async with llm_slots:
+        llm_in_flight += 1
+        try:
+            yield
+        finally:
+            llm_in_flight -= 1
+
+async def _expire_sessions():
+    while True:
+        await asyncio.sleep(min(60.0, SESSION_IDLE_TTL / 2))
+        store.expire_idle()
+        await store.finish_evicted()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Blocking recalls run via asyncio.to_thread; size the pool for many sessions at once
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=RECALL_WORKERS, thread_name_prefix="recall"))
+    await asyncio.to_thread(get_lexical_index)
+    writer = get_episodic_writer()
+    expiry = asyncio.create_task(_expire_sessions())
+    yield
+    expiry.cancel()
+    await store.finish_evicted()
+    await store.finish_all()
+    if not await asyncio.to_thread(writer.close, 60):
+        logger.warning("Memory writes still pending; they will resume on next start")
+
+app = FastAPI(title="Form trainer", lifespan=lifespan)
+
+class ChatMessage(BaseModel):
+    message: str
+
+@app.post("/sessions")
+async def create_session():
+    session = store.create()
+    await store.finish_evicted()
+    return {"session_id": session.id}
+
+@app.post("/sessions/{session_id}/messages")
+async def send_message(session_id: str, body: ChatMessage):
+    session = store.get(session_id)
+    return StreamingResponse(_reply(session, body.message), media_type="text/plain")
+
+async def _reply(session: Session, user_input: str):
+    """
+    Streams one turn's reply and records the turn in the session once it completes.
+    """
+    async with session.lock:
+        user_message = HumanMessage(content=user_input)
+        with span("turn", session=session.id):
+            system_prompt, context_message, prompt_history = await gather_turn_context(
+                user_input, session.history.prompt_messages(),
+                session.conversations, session.what_worked, session.what_to_avoid
+            )
+            session.system_prompt = system_prompt
+            prompt = [system_prompt] + prompt_history + [context_message, user_message]
+            context = fingerprint(system_prompt.content, context_message.content)
+            full = None
+            with span("llm.invoke", purpose="reply", stream=True):
+                async with llm_slot():
+                    async for chunk in get_cached_llm().astream(prompt, query=user_input, context=context):
+                        full = chunk if full is None else full + chunk
+                        if chunk.content:
+                            yield chunk.content
+            response = AIMessage(content=full.content if full else "")
+            session.history.add_turn(user_message, response)
+            session.reflection.turn_added()
+            session.last_seen = time.monotonic()
+
+@app.post("/sessions/{session_id}/end")
+async def end_session(session_id: str):
+    session = store.pop(session_id)
+    async with session.lock:
+        await session.finish()
+    return {"session_id": session_id, "stored": bool(session.history.transcript)}
+
+@app.delete("/sessions/{session_id}")
+async def drop_session(session_id: str):
+    store.pop(session_id)
+    return {"session_id": session_id}
+
+@app.get("/health")
+async def health():
+    return {
+        "sessions": len(store),
+        "evicted": store.evicted,
+        "llm_in_flight": llm_in_flight,
+        "llm_cache": get_llm_cache().stats(),
+        "semantic_selection": semantic_selection_stats(),
+    }
+
+if __name__ == "__main__":
+    import uvicorn
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
+    uvicorn.run(app, host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", "8000")))
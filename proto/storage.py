@@ -0,0 +1,461 @@
+# storage.py
+"""
+Storage backends for the episodic_memory and crossfit_nutrition tables.
+
+memory_manager and the maintenance jobs call these operations instead of building Supabase
+queries themselves, so the same pipeline runs against either backend:
+
+    MEMORY_BACKEND=supabase   the hosted Postgres tables and RPCs (default)
+    MEMORY_BACKEND=sqlite     a local SQLite file at SQLITE_PATH, with WAL journaling, FTS5
+                              indexes for recall and one transaction per batch of writes
+
+Rows are plain dicts with the same columns in both backends.
+"""
+import json
+import math
+import re
+import sqlite3
+import threading
+
+import numpy as np
+
+EPISODIC_RECALL_COLUMNS = ("id", "conversation", "conversation_summary", "what_worked", "what_to_avoid", "created_at")
+
+class SupabaseStore:
+    """
+    Backend over the Supabase client from config.get_supabase().
+    """
+
+    name = "supabase"
+
+    @property
+    def client(self):
+        from config import get_supabase
+        return get_supabase()
+
+    def insert_episodic(self, row: dict) -> dict:
+        response = self.client.table("episodic_memory").insert(row).execute()
+        return response.data[0] if response.data else None
+
+    def get_episodic(self, memory_id) -> dict:
+        response = self.client.table("episodic_memory").select("*").eq("id", memory_id).execute()
+        return response.data[0] if response.data else None
+
+    def update_episodic(self, memory_id, values: dict) -> dict:
+        response = self.client.table("episodic_memory").update(values).eq("id", memory_id).execute()
+        return response.data[0] if response.data else None
+
+    def upsert_episodic(self, rows: list):
+        self.client.table("episodic_memory").upsert(rows, on_conflict="id").execute()
+
+    def delete_episodic(self, ids: list):
+        self.client.table("episodic_memory").delete().in_("id", ids).execute()
+
+    def replace_episodic(self, row: dict, old_ids: list, archive: bool = True) -> dict:
+        # consolidate_episodic_memory is created by consolidate.ensure_archive_table_exists
+        response = self.client.rpc("consolidate_episodic_memory", {
+            "new_row": row,
+            "old_ids": old_ids,
+            "archive": archive,
+        }).execute()
+        return response.data[0] if response.data else None
+
+    def recent_episodic_signatures(self, limit: int) -> list:
+        response = self.client.table("episodic_memory") \
+            .select("id, transcript_minhash, summary_minhash") \
+            .order("created_at", desc=True) \
+            .limit(limit) \
+            .execute()
+        return response.data or []
+
+    def page_episodic(self, after_id, limit: int, columns: str = "*") -> list:
+        response = self.client.table("episodic_memory") \
+            .select(columns) \
+            .gt("id", after_id) \
+            .order("id") \
+            .limit(limit) \
+            .execute()
+        return response.data or []
+
+    def match_episodic(self, query: str, k: int, recency_half_life_days: float) -> list:
+        # match_episodic_memory is created by memory_manager.ensure_episodic_search_index
+        response = self.client.rpc("match_episodic_memory", {
+            "query_text": query,
+            "match_count": k,
+            "recency_half_life_days": recency_half_life_days,
+        }).execute()
+        return response.data or []
+
+    def upsert_chunks(self, rows: list, update_embedding: bool = False):
+        # PostgREST can't make the update conditional, so filling in embeddings merges every
+        # supplied column into existing rows; for a content-hash key that only refreshes metadata
+        self.client.table("crossfit_nutrition") \
+            .upsert(rows, on_conflict="chunk_hash", ignore_duplicates=not update_embedding) \
+            .execute()
+
+    def page_chunk_embeddings(self, after_id, limit: int) -> list:
+        response = self.client.table("crossfit_nutrition") \
+            .select("id, chunk, chunk_hash, embedding") \
+            .not_.is_("embedding", "null") \
+            .gt("id", after_id) \
+            .order("id") \
+            .limit(limit) \
+            .execute()
+        rows = response.data or []
+        for row in rows:
+            # PostgREST returns pgvector columns as their text form, e.g. "[0.1,0.2,...]"
+            if isinstance(row["embedding"], str):
+                row["embedding"] = json.loads(row["embedding"])
+        return rows
+
+    def source_chunk_hashes(self, source: str, page_size: int = 1000) -> list:
+        hashes, last_id = [], 0
+        while True:
+            response = self.client.table("crossfit_nutrition") \
+                .select("id, chunk_hash") \
+                .eq("source", source) \
+                .gt("id", last_id) \
+                .order("id") \
+                .limit(page_size) \
+                .execute()
+            rows = response.data or []
+            hashes.extend(row["chunk_hash"] for row in rows)
+            if len(rows) < page_size:
+                return hashes
+            last_id = rows[-1]["id"]
+
+    def delete_chunks(self, chunk_hashes: list, batch_size: int = 500):
+        # Batched so the in_ filter stays well inside URL length limits
+        for i in range(0, len(chunk_hashes), batch_size):
+            self.client.table("crossfit_nutrition").delete().in_("chunk_hash", chunk_hashes[i:i + batch_size]).execute()
+
+    def search_chunks(self, query: str, k: int) -> list:
+        # A substring match has no relevance score
+        response = self.client.table("crossfit_nutrition") \
+            .select("chunk") \
+            .ilike("chunk", f"%{query}%") \
+            .limit(k) \
+            .execute()
+        return [{"chunk": item["chunk"], "score": None} for item in response.data or []]
+
+    def vector_search(self, query_vector: list, k: int) -> list:
+        # semantic_search must be created in the Supabase SQL editor
+        response = self.client.rpc("semantic_search", {"query_vector": query_vector, "limit_count": k}).execute()
+        return response.data or []
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS episodic_memory (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation TEXT NOT NULL,
+    context_tags TEXT NOT NULL DEFAULT '[]',
+    conversation_summary TEXT,
+    what_worked TEXT,
+    what_to_avoid TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+    transcript_minhash TEXT,
+    summary_minhash TEXT
+);
+CREATE INDEX IF NOT EXISTS episodic_memory_created_at_idx ON episodic_memory (created_at DESC);
+
+-- Full-text index over the summary and context tags (underscores split), kept in step by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS episodic_memory_fts USING fts5(search_text, tokenize='porter unicode61');
+CREATE TRIGGER IF NOT EXISTS episodic_memory_fts_insert AFTER INSERT ON episodic_memory BEGIN
+    INSERT INTO episodic_memory_fts (rowid, search_text) VALUES (new.id,
+        coalesce(new.conversation_summary, '') || ' ' ||
+        replace(coalesce((SELECT group_concat(value, ' ') FROM json_each(new.context_tags)), ''), '_', ' '));
+END;
+CREATE TRIGGER IF NOT EXISTS episodic_memory_fts_update AFTER UPDATE OF conversation_summary, context_tags ON episodic_memory BEGIN
+    DELETE FROM episodic_memory_fts WHERE rowid = old.id;
+    INSERT INTO episodic_memory_fts (rowid, search_text) VALUES (new.id,
+        coalesce(new.conversation_summary, '') || ' ' ||
+        replace(coalesce((SELECT group_concat(value, ' ') FROM json_each(new.context_tags)), ''), '_', ' '));
+END;
+CREATE TRIGGER IF NOT EXISTS episodic_memory_fts_delete AFTER DELETE ON episodic_memory BEGIN
+    DELETE FROM episodic_memory_fts WHERE rowid = old.id;
+END;
+
+CREATE TABLE IF NOT EXISTS episodic_memory_archive (
+    id INTEGER PRIMARY KEY,
+    conversation TEXT NOT NULL,
+    context_tags TEXT NOT NULL DEFAULT '[]',
+    conversation_summary TEXT,
+    what_worked TEXT,
+    what_to_avoid TEXT,
+    created_at TEXT,
+    consolidated_into INTEGER,
+    archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS crossfit_nutrition (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chunk TEXT NOT NULL,
+    chunk_hash TEXT UNIQUE,
+    source TEXT,
+    page INTEGER,
+    start_byte INTEGER,
+    end_byte INTEGER,
+    embedding BLOB,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS crossfit_nutrition_fts USING fts5(
+    chunk, content='crossfit_nutrition', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS crossfit_nutrition_fts_insert AFTER INSERT ON crossfit_nutrition BEGIN
+    INSERT INTO crossfit_nutrition_fts (rowid, chunk) VALUES (new.id, new.chunk);
+END;
+CREATE TRIGGER IF NOT EXISTS crossfit_nutrition_fts_delete AFTER DELETE ON crossfit_nutrition BEGIN
+    INSERT INTO crossfit_nutrition_fts (crossfit_nutrition_fts, rowid, chunk) VALUES ('delete', old.id, old.chunk);
+END;
+"""
+
+# Columns stored as JSON text in SQLite (arrays in Postgres)
+JSON_COLUMNS = ("context_tags", "transcript_minhash", "summary_minhash")
+EPISODIC_COLUMNS = ("id", "conversation", "context_tags", "conversation_summary", "what_worked",
+                    "what_to_avoid", "created_at", "transcript_minhash", "summary_minhash")
+ARCHIVE_COLUMNS = EPISODIC_COLUMNS[:7] + ("consolidated_into",)
+CHUNK_COLUMNS = ("chunk", "chunk_hash", "source", "page", "start_byte", "end_byte", "embedding")
+WORD_PATTERN = re.compile(r"\w+")
+
+def fts_query(text: str) -> str:
+    """
+    FTS5 query matching any word of text (OR), with each word quoted so punctuation and
+    keywords in user input can't break the query syntax.
+    """
+    words = dict.fromkeys(word.lower() for word in WORD_PATTERN.findall(text))
+    return " OR ".join(f'"{word}"' for word in words)
+
+class SQLiteStore:
+    """
+    Embedded backend in a single SQLite file. Each thread gets its own connection (WAL lets
+    readers run alongside the writer); writes are serialized by a lock and every call commits
+    its whole batch in one transaction.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = "./memory.sqlite"):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock, self._conn() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Not every SQLite build ships the math functions used by the recency decay
+            conn.create_function("exp", 1, math.exp, deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    def _write(self, sql: str, params=(), many: bool = False):
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                return conn.executemany(sql, params) if many else conn.execute(sql, params)
+
+    @staticmethod
+    def _encode(row: dict) -> dict:
+        row = dict(row)
+        for column in JSON_COLUMNS:
+            if column in row and row[column] is not None:
+                row[column] = json.dumps(row[column])
+        return row
+
+    @staticmethod
+    def _decode(row) -> dict:
+        row = dict(row)
+        for column in JSON_COLUMNS:
+            if isinstance(row.get(column), str):
+                row[column] = json.loads(row[column])
+        return row
+
+    def insert_episodic(self, row: dict) -> dict:
+        row = self._encode(row)
+        columns = [c for c in EPISODIC_COLUMNS if c in row]
+        sql = f"INSERT INTO episodic_memory ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) RETURNING *"
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                inserted = conn.execute(sql, [row[c] for c in columns]).fetchone()
+        return self._decode(inserted)
+
+    def get_episodic(self, memory_id) -> dict:
+        row = self._conn().execute("SELECT * FROM episodic_memory WHERE id = ?", (memory_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def update_episodic(self, memory_id, values: dict) -> dict:
+        values = self._encode(values)
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                row = conn.execute(f"UPDATE episodic_memory SET {assignments} WHERE id = ? RETURNING *",
+                                   [*values.values(), memory_id]).fetchone()
+        return self._decode(row) if row else None
+
+    def upsert_episodic(self, rows: list):
+        if not rows:
+            return
+        rows = [self._encode(row) for row in rows]
+        columns = [c for c in EPISODIC_COLUMNS if c in rows[0]]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "id")
+        sql = f"INSERT INTO episodic_memory ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) " \
+              f"ON CONFLICT (id) DO UPDATE SET {updates}"
+        self._write(sql, [[row.get(c) for c in columns] for row in rows], many=True)
+
+    def delete_episodic(self, ids: list):
+        self._write("DELETE FROM episodic_memory WHERE id = ?", [(i,) for i in ids], many=True)
+
+    def replace_episodic(self, row: dict, old_ids: list, archive: bool = True) -> dict:
+        """
+        Inserts row and archives (with consolidated_into set) or deletes the old_ids rows in one
+        transaction, so a failure part way never leaves both the originals and their replacement.
+        """
+        row = self._encode(row)
+        columns = [c for c in EPISODIC_COLUMNS if c in row]
+        placeholders = ", ".join("?" * len(old_ids))
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                inserted = conn.execute(
+                    f"INSERT INTO episodic_memory ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                    f"RETURNING *", [row[c] for c in columns]
+                ).fetchone()
+                if archive:
+                    conn.execute(
+                        f"INSERT OR IGNORE INTO episodic_memory_archive ({', '.join(ARCHIVE_COLUMNS)}) "
+                        f"SELECT {', '.join(ARCHIVE_COLUMNS[:-1])}, ? FROM episodic_memory WHERE id IN ({placeholders})",
+                        [inserted["id"], *old_ids]
+                    )
+                conn.execute(f"DELETE FROM episodic_memory WHERE id IN ({placeholders})", old_ids)
+        return self._decode(inserted)
+
+    def recent_episodic_signatures(self, limit: int) -> list:
+        rows = self._conn().execute(
+            "SELECT id, transcript_minhash, summary_minhash FROM episodic_memory ORDER BY created_at DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def page_episodic(self, after_id, limit: int, columns: str = "*") -> list:
+        rows = self._conn().execute(
+            f"SELECT {columns} FROM episodic_memory WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+        ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def match_episodic(self, query: str, k: int, recency_half_life_days: float) -> list:
+        """
+        Same ranking as the match_episodic_memory RPC: FTS relevance of any query term, scaled
+        by 0.5 + 0.5 * exp(-age_days / recency_half_life_days).
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        rows = self._conn().execute(f"""
+            SELECT {', '.join('m.' + c for c in EPISODIC_RECALL_COLUMNS)},
+                   -bm25(episodic_memory_fts)
+                     * (0.5 + 0.5 * exp(-(julianday('now') - julianday(m.created_at)) / ?)) AS score
+            FROM episodic_memory_fts JOIN episodic_memory m ON m.id = episodic_memory_fts.rowid
+            WHERE episodic_memory_fts MATCH ?
+            ORDER BY score DESC
+            LIMIT ?
+        """, (recency_half_life_days, match, k)).fetchall()
+        return [dict(row) for row in rows]
+
+    def upsert_chunks(self, rows: list, update_embedding: bool = False):
+        """
+        Inserts chunk rows, skipping chunk_hashes already stored. With update_embedding, stored
+        rows that have no embedding yet take the one supplied.
+        """
+        params = []
+        for row in rows:
+            values = [row.get(c) for c in CHUNK_COLUMNS]
+            if values[-1] is not None:
+                values[-1] = np.asarray(values[-1], dtype=np.float32).tobytes()
+            params.append(values)
+        sql = f"INSERT INTO crossfit_nutrition ({', '.join(CHUNK_COLUMNS)}) " \
+              f"VALUES ({', '.join('?' * len(CHUNK_COLUMNS))}) ON CONFLICT (chunk_hash) DO "
+        if update_embedding:
+            sql += "UPDATE SET embedding = excluded.embedding " \
+                   "WHERE crossfit_nutrition.embedding IS NULL AND excluded.embedding IS NOT NULL"
+        else:
+            sql += "NOTHING"
+        self._write(sql, params, many=True)
+
+    def page_chunk_embeddings(self, after_id, limit: int) -> list:
+        rows = self._conn().execute(
+            "SELECT id, chunk, chunk_hash, embedding FROM crossfit_nutrition "
+            "WHERE embedding IS NOT NULL AND id > ? ORDER BY id LIMIT ?", (after_id, limit)
+        ).fetchall()
+        return [{"id": row["id"], "chunk": row["chunk"], "chunk_hash": row["chunk_hash"],
+                 "embedding": np.frombuffer(row["embedding"], dtype=np.float32)} for row in rows]
+
+    def source_chunk_hashes(self, source: str) -> list:
+        rows = self._conn().execute("SELECT chunk_hash FROM crossfit_nutrition WHERE source = ?", (source,)).fetchall()
+        return [row["chunk_hash"] for row in rows]
+
+    def delete_chunks(self, chunk_hashes: list):
+        self._write("DELETE FROM crossfit_nutrition WHERE chunk_hash = ?", [(h,) for h in chunk_hashes], many=True)
+
+    def search_chunks(self, query: str, k: int) -> list:
+        """
+        FTS5 search returning {"chunk", "score"} dicts, best first. score is the negated bm25()
+        rank, so higher is better.
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        rows = self._conn().execute("""
+            SELECT c.chunk, -bm25(crossfit_nutrition_fts) AS score FROM crossfit_nutrition_fts JOIN crossfit_nutrition c ON c.id = crossfit_nutrition_fts.rowid
+            WHERE crossfit_nutrition_fts MATCH ?
+            ORDER BY bm25(crossfit_nutrition_fts)
+            LIMIT ?
+        """, (match, k)).fetchall()
+        return [{"chunk": row["chunk"], "score": row["score"]} for row in rows]
+
+    def vector_search(self, query_vector: list, k: int) -> list:
+        """
+        Exact cosine search over the stored chunk embeddings.
+        """
+        rows = self._conn().execute(
+            "SELECT id, chunk, embedding FROM crossfit_nutrition WHERE embedding IS NOT NULL"
+        ).fetchall()
+        if not rows:
+            return []
+        matrix = np.frombuffer(b"".join(row["embedding"] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+        top = np.argsort(-scores)[:k]
+        return [{"id": rows[i]["id"], "chunk": rows[i]["chunk"], "similarity": float(scores[i])} for i in top]
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """
+    Returns the process-wide storage backend selected by MEMORY_BACKEND.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                from config import MEMORY_BACKEND, SQLITE_PATH
+                if MEMORY_BACKEND == "sqlite":
+                    _store = SQLiteStore(SQLITE_PATH)
+                elif MEMORY_BACKEND == "supabase":
+                    _store = SupabaseStore()
+                else:
+                    raise ValueError(f"Unknown MEMORY_BACKEND {MEMORY_BACKEND!r} (expected 'supabase' or 'sqlite')")
+    return _store
+
+def set_store(store):
+    """
+    Replaces the process-wide storage backend.
+    """
+    global _store
+    _store = store
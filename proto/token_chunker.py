@@ -0,0 +1,80 @@
+# token_chunker.py
+"""
+Chunker that measures chunk size in model tokens rather than characters.
+
+The text is tokenized once and every separator is found in a single regex pass, so splitting
+is linear in the length of the document. Each chunk is at most chunk_tokens tokens and ends at
+the strongest separator (paragraph, line, sentence, word) in the second half of its window,
+so chunk sizes stay close to chunk_tokens. Consecutive chunks can share overlap_tokens tokens.
+"""
+import re
+from bisect import bisect_left
+
+from context_budget import get_encoding
+
+# Separator strength, strongest first; a break falls just after the matched separator
+SEPARATOR_PATTERN = re.compile(r"(\n\s*\n)|(\n)|([.?!])(?=\s)|(\s)")
+
+def _break_points(text: str, offsets: list) -> tuple:
+    """
+    One pass over text: returns token boundary indexes that follow a separator, with the
+    strength of the strongest separator at each (0 is strongest).
+    """
+    boundaries, strengths = [], []
+    token = 0
+    for match in SEPARATOR_PATTERN.finditer(text):
+        strength = match.lastindex - 1
+        # Word breaks go before the space (tokens usually start with it), the rest after the separator
+        position = match.start() if strength == 3 else match.end()
+        # Positions only increase, so the token index is found by walking forward, not searching
+        while token < len(offsets) and offsets[token] < position:
+            token += 1
+        if token == 0 or token >= len(offsets):
+            continue
+        if boundaries and boundaries[-1] == token:
+            strengths[-1] = min(strengths[-1], strength)
+        else:
+            boundaries.append(token)
+            strengths.append(strength)
+    return boundaries, strengths
+
+def token_chunk_spans(text: str, chunk_tokens: int = 200, overlap_tokens: int = 0, model: str = "gpt-4o") -> list:
+    """
+    Splits text into chunks of at most chunk_tokens tokens. Returns (start_char, end_char,
+    token_count) spans into text.
+    """
+    if overlap_tokens >= chunk_tokens:
+        raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+    tokens = get_encoding(model).encode(text, disallowed_special=())
+    if not tokens:
+        return []
+    _, offsets = get_encoding(model).decode_with_offsets(tokens)
+    boundaries, strengths = _break_points(text, offsets)
+    offsets = offsets + [len(text)]
+
+    spans = []
+    start = 0
+    while start < len(tokens):
+        limit = start + chunk_tokens
+        if limit >= len(tokens):
+            end = len(tokens)
+        else:
+            # Strongest separator in the second half of the window, latest on ties
+            lo = bisect_left(boundaries, start + max(1, chunk_tokens // 2))
+            hi = bisect_left(boundaries, limit + 1)
+            end, best = limit, None
+            for i in range(lo, hi):
+                if best is None or strengths[i] <= best:
+                    end, best = boundaries[i], strengths[i]
+        spans.append((offsets[start], offsets[end], end - start))
+        if end == len(tokens):
+            break
+        start = max(end - overlap_tokens, start + 1)
+    return spans
+
+def split_text_by_tokens(text: str, chunk_tokens: int = 200, overlap_tokens: int = 0, model: str = "gpt-4o") -> list:
+    """
+    Splits text into whitespace-trimmed chunks of at most chunk_tokens tokens.
+    """
+    chunks = (text[start:end].strip() for start, end, _ in token_chunk_spans(text, chunk_tokens, overlap_tokens, model))
+    return [chunk for chunk in chunks if chunk]
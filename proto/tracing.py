@@ -0,0 +1,101 @@
+# tracing.py
+"""
+Per-stage tracing spans for the memory pipeline.
+
+Tracing is off unless TRACE_EXPORT is set:
+    TRACE_EXPORT=file     spans are appended as JSON lines to TRACE_FILE (default ./traces.jsonl)
+    TRACE_EXPORT=otlp     spans go to an OTLP/gRPC collector at OTEL_EXPORTER_OTLP_ENDPOINT
+When disabled, span() hands back a shared no-op object and the OpenTelemetry SDK is never imported.
+"""
+import json
+import os
+import threading
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+_NOOP = _NoopSpan()
+_tracer = None
+_lock = threading.Lock()
+ENABLED = bool(os.getenv("TRACE_EXPORT"))
+
+class JsonLinesSpanExporter:
+    """
+    OpenTelemetry span exporter that appends one JSON object per span to a local file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+        lines = []
+        for s in spans:
+            lines.append(json.dumps({
+                "name": s.name,
+                "trace_id": format(s.context.trace_id, "032x"),
+                "span_id": format(s.context.span_id, "016x"),
+                "parent_id": format(s.parent.span_id, "016x") if s.parent else None,
+                "start_ns": s.start_time,
+                "duration_ms": (s.end_time - s.start_time) / 1e6,
+                "status": s.status.status_code.name,
+                "attributes": dict(s.attributes or {}),
+            }))
+        with self._lock, open(self.path, "a") as f:
+            f.write("\n".join(lines) + "\n")
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000):
+        return True
+
+def _get_tracer():
+    global _tracer
+    if _tracer is None:
+        with _lock:
+            if _tracer is None:
+                from opentelemetry import trace
+                from opentelemetry.sdk.resources import Resource
+                from opentelemetry.sdk.trace import TracerProvider
+                from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+                provider = TracerProvider(resource=Resource.create({"service.name": "form-trainer"}))
+                if os.getenv("TRACE_EXPORT") == "otlp":
+                    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+                    exporter = OTLPSpanExporter()
+                else:
+                    exporter = JsonLinesSpanExporter(os.getenv("TRACE_FILE", "./traces.jsonl"))
+                provider.add_span_processor(BatchSpanProcessor(exporter))
+                trace.set_tracer_provider(provider)
+                _tracer = trace.get_tracer("form.memory")
+    return _tracer
+
+def span(name: str, **attributes):
+    """
+    Context manager for a span named name with the given attributes. Use set_attribute on the
+    returned span to record values (row counts, token counts, payload bytes) known only later.
+    """
+    if not ENABLED:
+        return _NOOP
+    return _get_tracer().start_as_current_span(name, attributes=attributes)
+
+def payload_bytes(value) -> int:
+    """
+    Approximate size of a payload in bytes, for span attributes.
+    """
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, default=str).encode("utf-8"))
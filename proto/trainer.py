@@ -1,12 +1,31 @@
 # trainer.py
-from langchain_core.messages import HumanMessage
-from config import llm, supabase
+import asyncio
+import logging
+import os
+import time
+from langchain_core.messages import HumanMessage, AIMessage
+from config import (
+    EPISODIC_TIMEOUT, SEMANTIC_TIMEOUT, EPISODIC_CLOSE_TIMEOUT,
+    CONTEXT_TOKEN_BUDGET, SYSTEM_PROMPT_MAX_TOKENS, SEMANTIC_MAX_TOKENS, HISTORY_KEEP_TURNS,
+    REFLECT_EVERY_TURNS
+)
 from memory_manager import (
-    episodic_system_prompt,
-    add_episodic_memory,
-    procedural_memory_update,
-    semantic_rag
+    episodic_recall,
+    semantic_recall_chunks,
+    build_episodic_system_prompt,
+    build_semantic_message,
+    format_chunks,
+    get_lexical_index
+)
+from context_budget import (
+    count_tokens, allocate_budget, take_within_budget, take_history_within_budget, log_section_tokens
 )
+from helpers import format_conversation
+from episodic_writer import get_episodic_writer
+from history import ConversationHistory, RunningReflection
+from llm_cache import get_cached_llm, fingerprint
+import tracing
+from tracing import span
 
 
 # ALTERNATIVE OPTION FOR MEM
@@ -49,44 +68,162 @@ from memory_manager import (
     
 #     return messages
 
-def trainer_memory():
+async def _recall_with_timeout(recall, query: str, timeout: float, label: str):
+    """
+    Run a blocking recall in a worker thread, returning None if it fails or misses its deadline.
+    """
+    try:
+        return await asyncio.wait_for(asyncio.to_thread(recall, query), timeout)
+    except asyncio.TimeoutError:
+        print(f"\n({label} recall timed out after {timeout:.1f}s, continuing without it)")
+    except Exception as e:
+        print(f"\n({label} recall failed: {e})")
+    return None
+
+async def gather_turn_context(user_input: str, history, conversations, what_worked, what_to_avoid,
+                              include_semantic: bool = True):
+    """
+    Run episodic and semantic recall concurrently and build the turn's system prompt, grounding
+    message and prompt history. A recall that is slow or fails is left out, so the turn waits at
+    most for the slowest timeout rather than the sum of both recalls.
+
+    The prompt is fitted to CONTEXT_TOKEN_BUDGET in priority order: the system prompt (capped at
+    SYSTEM_PROMPT_MAX_TOKENS), then semantic chunks (capped at SEMANTIC_MAX_TOKENS), then the
+    history summary and as many of the most recent whole turns as fit in what is left.
+    """
+    recalls = [_recall_with_timeout(episodic_recall, user_input, EPISODIC_TIMEOUT, "Episodic")]
+    if include_semantic:
+        recalls.append(_recall_with_timeout(semantic_recall_chunks, user_input, SEMANTIC_TIMEOUT, "Semantic"))
+    memory, *semantic = await asyncio.gather(*recalls)
+    chunks = (semantic[0] or []) if include_semantic else []
+    # Reading procedural memory and counting tokens block, so they run off the event loop. The
+    # session state passed in is only touched by this one thread while the turn awaits it.
+    return await asyncio.to_thread(_fit_turn_context, user_input, history, memory, chunks,
+                                   conversations, what_worked, what_to_avoid, include_semantic)
+
+def _fit_turn_context(user_input: str, history, memory, chunks, conversations, what_worked, what_to_avoid,
+                      include_semantic: bool):
+    """
+    Builds the system prompt, grounding message and prompt history from the recalled memory
+    and chunks, fitted to CONTEXT_TOKEN_BUDGET as described in gather_turn_context.
+    """
+    system_prompt = build_episodic_system_prompt(memory, conversations, what_worked, what_to_avoid)
+    system_tokens = count_tokens(system_prompt.content)
+    empty_context_tokens = count_tokens(build_semantic_message("").content)
+    chunk_tokens = sum(count_tokens(chunk) for chunk in chunks)
+    history_tokens = sum(count_tokens(msg.content) for msg in history)
+    user_tokens = count_tokens(user_input)
+    allowances = allocate_budget(CONTEXT_TOKEN_BUDGET - user_tokens - empty_context_tokens, [
+        ("system", system_tokens, SYSTEM_PROMPT_MAX_TOKENS),
+        ("semantic", chunk_tokens, SEMANTIC_MAX_TOKENS),
+        ("history", history_tokens, None),
+    ])
+
+    if system_tokens > allowances["system"]:
+        system_prompt = build_episodic_system_prompt(memory, conversations, what_worked, what_to_avoid,
+                                                     token_budget=allowances["system"])
+    chunks = take_within_budget(chunks, allowances["semantic"])
+    prompt_history = take_history_within_budget(history, allowances["history"])
+    context_message = build_semantic_message(format_chunks(chunks)) if include_semantic else None
+
+    log_section_tokens({
+        "system": count_tokens(system_prompt.content),
+        "semantic": count_tokens(context_message.content) if context_message else 0,
+        "history": sum(count_tokens(msg.content) for msg in prompt_history),
+        "user": user_tokens,
+    }, CONTEXT_TOKEN_BUDGET)
+    return system_prompt, context_message, prompt_history
+
+async def stream_response(prompt_messages, query: str = None, context: str = None):
+    """
+    Stream the LLM's reply to stdout as tokens arrive and return the assembled AIMessage,
+    along with time-to-first-token and total generation time in seconds.
+    Replies go through the response cache; query and context enable its semantic tier.
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    full = None
+    print("\nAI Message: ", end="", flush=True)
+    async for chunk in get_cached_llm().astream(prompt_messages, query=query, context=context):
+        if first_token_at is None and chunk.content:
+            first_token_at = time.perf_counter()
+        print(chunk.content, end="", flush=True)
+        full = chunk if full is None else full + chunk
+    print()
+    total = time.perf_counter() - start
+    ttft = (first_token_at - start) if first_token_at else total
+    response = AIMessage(content=full.content if full else "", response_metadata=full.response_metadata if full else {})
+    return response, ttft, total
+
+def trainer_memory(stream: bool = True):
     """
     Main interactive loop for training. It collects user input, generates context-aware responses,
-    and updates episodic and procedural memory.
+    and updates episodic and procedural memory. With stream=True replies are printed token by token.
+    """
+    return asyncio.run(trainer_memory_async(stream))
+
+async def trainer_memory_async(stream: bool = True):
+    """
+    Async body of trainer_memory; per-turn retrieval runs concurrently.
     """
     # print("Using Supabase for memory storage.")
+    get_lexical_index()  # load the BM25 index up front so the first turn doesn't pay for it
+    writer = get_episodic_writer()  # also replays sessions left in the spool by an earlier run
     conversations = []
     what_worked = set()
     what_to_avoid = set()
-    messages = []
+    history = ConversationHistory(keep_turns=HISTORY_KEEP_TURNS)
+    reflection = RunningReflection(history.transcript, every_turns=REFLECT_EVERY_TURNS)
 
     while True:
-        user_input = input("\nUser: ")
+        user_input = await asyncio.to_thread(input, "\nUser: ")
         user_message = HumanMessage(content=user_input)
-        system_prompt = episodic_system_prompt(user_input, conversations, what_worked, what_to_avoid)
-        # Prepend the new system prompt while preserving non-system messages
-        messages = [system_prompt] + [msg for msg in messages if not hasattr(msg, "role") or msg.role != "system"]
-
-        if user_input.lower() == "exit":
-            add_episodic_memory(messages)
-            print("\n== Conversation Stored in Episodic Memory ==")
-            procedural_memory_update(what_worked, what_to_avoid)
-            print("\n== Procedural Memory Updated ==")
-            break
-        if user_input.lower() == "exit_quiet":
-            print("\n== Conversation Exited ==")
-            break
-
-        # Retrieve context using semantic recall
-        context_message = semantic_rag(user_input)
-        response = llm.invoke(messages + [context_message, user_message])
-        print("\nAI Message:", response.content)
-        messages.extend([user_message, response])
-
-    return messages
+        is_exit = user_input.lower() in ("exit", "exit_quiet")
+        with span("turn"):
+            system_prompt, context_message, prompt_history = await gather_turn_context(
+                user_input, history.prompt_messages(), conversations, what_worked, what_to_avoid,
+                include_semantic=not is_exit
+            )
+            # The full transcript is kept for episodic memory; only prompt_history is sent to the LLM
+            messages = [system_prompt] + history.transcript
+
+            if user_input.lower() == "exit":
+                # Reflection, storage and the procedural update happen in the background; the
+                # running reflection means only the last few turns still need reflecting on
+                running, unreflected = reflection.snapshot()
+                writer.submit(format_conversation(messages), what_worked, what_to_avoid,
+                              reflection=running, unreflected=unreflected)
+                print("\n== Conversation Queued for Episodic and Procedural Memory ==")
+                break
+            if user_input.lower() == "exit_quiet":
+                print("\n== Conversation Exited ==")
+                break
+
+            prompt = [system_prompt] + prompt_history + [context_message, user_message]
+            context = fingerprint(system_prompt.content, context_message.content)
+            with span("llm.invoke", purpose="reply", stream=stream) as sp:
+                if tracing.ENABLED:
+                    sp.set_attribute("prompt_tokens", sum(count_tokens(msg.content) for msg in prompt))
+                if stream:
+                    response, ttft, total = await stream_response(prompt, query=user_input, context=context)
+                    sp.set_attribute("ttft_ms", ttft * 1000)
+                    print(f"(first token {ttft * 1000:.0f} ms, generation {total * 1000:.0f} ms)")
+                else:
+                    response = await get_cached_llm().ainvoke(prompt, query=user_input, context=context)
+                    print("\nAI Message:", response.content)
+            history.add_turn(user_message, response)
+            reflection.turn_added()
+
+    return [system_prompt] + history.transcript
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
     try:
         trainer_memory()
     except Exception as e:
         print(f"Error occurred: {e}")
+    finally:
+        # Give the session just queued a short grace period to be stored; anything still pending
+        # is already in the spool and is replayed on the next run
+        if not get_episodic_writer().close(timeout=EPISODIC_CLOSE_TIMEOUT):
+            print("\n== Memory writes still pending; they will resume on next start ==")
@@ -0,0 +1,256 @@
+# vector_index.py
+"""
+Local, quantized vector index over chunk embeddings, used by vectorized_semantic_search in
+place of the pgvector RPC once it has been built.
+
+    python vector_index.py --quantization int8      # or binary
+
+Vectors are stored twice on disk, both memory-mapped:
+
+    codes.i8 / codes.bin   int8 (dim bytes per vector) or sign bits (dim / 8 bytes per vector)
+    vectors.f32            float32 unit vectors, read only to re-rank a shortlist
+
+A query scans the codes to pick a shortlist of rerank * k candidates, then scores only those
+rows exactly (cosine) from the float32 sidecar. Only the codes are touched on every query, so
+the working set is 4x (int8) or 32x (binary) smaller than the float32 matrix; the sidecar
+stays in the page cache only for the rows actually re-ranked.
+
+The scan is exhaustive rather than an HNSW graph: hnswlib (pinned for chroma) keeps full
+float32 vectors in RAM inside its graph and cannot store quantized ones, which is the memory
+this index exists to avoid. At the corpus sizes here (tens of thousands of chunks) a scan is
+milliseconds: binary codes are faster than exact float32 search, int8 somewhat slower since
+each block is widened to float32 for the product. See vector_benchmark.py.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+CODE_FILES = {"int8": "codes.i8", "binary": "codes.bin"}
+DEFAULT_RERANK = {"int8": 4, "binary": 16}
+
+def _unit(vectors) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+class QuantizedVectorIndex:
+    """
+    Append-only quantized index keyed by chunk_hash. Removed keys are tombstoned and skipped
+    by search; rebuild the index to reclaim their space.
+    """
+
+    def __init__(self, directory: str, quantization: str = "int8", rerank: int = None, block_rows: int = 2048):
+        if quantization not in CODE_FILES:
+            raise ValueError(f"quantization must be one of {sorted(CODE_FILES)}")
+        self.directory = directory
+        self.quantization = quantization
+        self.rerank = rerank or DEFAULT_RERANK[quantization]
+        self.block_rows = block_rows
+        self.dim = None
+        self.scale = None      # int8: per-dimension value that maps to 127
+        self.center = None     # binary: per-dimension threshold for the sign bit
+        self.keys = []         # chunk_hash per row (None once removed)
+        self.chunks = []       # chunk text per row (None once removed)
+        self._rows = {}
+        self._removed = []     # tombstoned rows, masked out of every search
+        self._codes = None
+        self._vectors = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.directory, "meta.json")
+
+    @property
+    def _codes_path(self):
+        return os.path.join(self.directory, CODE_FILES[self.quantization])
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.directory, "vectors.f32")
+
+    @property
+    def _code_width(self):
+        return self.dim if self.quantization == "int8" else (self.dim + 7) // 8
+
+    def _open(self):
+        rows = len(self.keys)
+        if not rows:
+            self._codes = self._vectors = None
+            return
+        dtype = np.int8 if self.quantization == "int8" else np.uint8
+        self._codes = np.memmap(self._codes_path, dtype=dtype, mode="r", shape=(rows, self._code_width))
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def _truncate(self):
+        """
+        Cuts the data files back to the rows meta.json knows about. add() writes vectors before
+        save() writes the keys, so a crash in between leaves rows past the end of keys; appending
+        after them would misalign every later key with its vector.
+        """
+        rows = len(self.keys)
+        widths = {self._codes_path: self._code_width, self._vectors_path: 4 * self.dim} if self.dim else {}
+        for path in (self._codes_path, self._vectors_path):
+            size = rows * widths.get(path, 0)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+    def _encode(self, unit: np.ndarray) -> np.ndarray:
+        if self.quantization == "int8":
+            return np.clip(np.rint(unit / self.scale * 127), -127, 127).astype(np.int8)
+        return np.packbits(unit > self.center, axis=1)
+
+    def add(self, keys: list, chunks: list, vectors: list) -> int:
+        """
+        Appends vectors for keys not already in the index. Returns the number added.
+        """
+        fresh = {}
+        for key, chunk, vector in zip(keys, chunks, vectors):
+            if key not in self._rows and key not in fresh and vector is not None:
+                fresh[key] = (chunk, vector)
+        if not fresh:
+            return 0
+        unit = _unit([vector for _, vector in fresh.values()])
+        if self.dim is None:
+            # Quantization parameters come from the first batch and stay fixed, so codes never need rewriting
+            os.makedirs(self.directory, exist_ok=True)
+            self.dim = unit.shape[1]
+            self.scale = np.maximum(np.abs(unit).max(axis=0), 1e-6)
+            self.center = np.median(unit, axis=0)
+        self._truncate()
+        with open(self._codes_path, "ab") as f:
+            f.write(self._encode(unit).tobytes())
+        with open(self._vectors_path, "ab") as f:
+            f.write(unit.tobytes())
+        for key, (chunk, _) in fresh.items():
+            self._rows[key] = len(self.keys)
+            self.keys.append(key)
+            self.chunks.append(chunk)
+        self._open()
+        return len(fresh)
+
+    def remove(self, keys) -> int:
+        removed = 0
+        for key in keys:
+            row = self._rows.pop(key, None)
+            if row is not None:
+                self.keys[row] = self.chunks[row] = None
+                self._removed.append(row)
+                removed += 1
+        return removed
+
+    def _approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """
+        Scores every row from its codes, a block at a time so no full-size float copy is made.
+        Higher is better; the scale differs between quantizations.
+        """
+        scores = np.empty(len(self.keys), dtype=np.float32)
+        if self.quantization == "int8":
+            weights = (query * self.scale / 127).astype(np.float32)
+        else:
+            bits = np.packbits(query > self.center)
+        for start in range(0, len(self.keys), self.block_rows):
+            block = self._codes[start:start + self.block_rows]
+            if self.quantization == "int8":
+                scores[start:start + len(block)] = block.astype(np.float32) @ weights
+            else:
+                scores[start:start + len(block)] = -np.bitwise_count(block ^ bits).sum(axis=1, dtype=np.int32)
+        return scores
+
+    def search(self, query_vector: list, k: int = 5) -> list:
+        """
+        Returns up to k {"chunk_hash", "chunk", "similarity"} dicts, best first. Similarity is
+        the exact cosine from the float32 sidecar.
+        """
+        if not self._rows or k <= 0:
+            return []
+        query = _unit(query_vector)[0]
+        scores = self._approximate_scores(query)
+        scores[self._removed] = -np.inf
+        shortlist = min(len(self._rows), k * self.rerank)
+        candidates = np.sort(np.argpartition(-scores, shortlist - 1)[:shortlist])
+        exact = self._vectors[candidates] @ query
+        order = np.argsort(-exact)[:k]
+        return [{"chunk_hash": self.keys[candidates[i]], "chunk": self.chunks[candidates[i]],
+                 "similarity": float(exact[i])} for i in order]
+
+    def nbytes(self) -> dict:
+        """
+        On-disk size of the codes scanned per query and of the float32 sidecar.
+        """
+        rows = len(self.keys)
+        return {"codes": rows * (self._code_width if self.dim else 0), "float32": rows * 4 * (self.dim or 0)}
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        meta = {
+            "quantization": self.quantization,
+            "dim": self.dim,
+            "scale": self.scale.tolist() if self.scale is not None else None,
+            "center": self.center.tolist() if self.center is not None else None,
+            "keys": self.keys,
+            "chunks": self.chunks,
+        }
+        tmp = f"{self._meta_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path)
+
+    @classmethod
+    def load(cls, directory: str, rerank: int = None):
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        index = cls(directory, meta["quantization"], rerank)
+        index.dim = meta["dim"]
+        if meta["scale"] is not None:
+            index.scale = np.asarray(meta["scale"], dtype=np.float32)
+            index.center = np.asarray(meta["center"], dtype=np.float32)
+        index.keys = meta["keys"]
+        index.chunks = meta["chunks"]
+        index._rows = {key: row for row, key in enumerate(index.keys) if key is not None}
+        index._removed = [row for row, key in enumerate(index.keys) if key is None]
+        index._truncate()
+        index._open()
+        return index
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, "meta.json"))
+
+def build_vector_index(directory: str, quantization: str = "int8", page_size: int = 1000) -> QuantizedVectorIndex:
+    """
+    Builds a fresh index from every embedded chunk in crossfit_nutrition, replacing any index
+    already in directory.
+    """
+    from storage import get_store
+
+    for name in ["meta.json", "vectors.f32", *CODE_FILES.values()]:
+        if os.path.exists(os.path.join(directory, name)):
+            os.remove(os.path.join(directory, name))
+    index = QuantizedVectorIndex(directory, quantization)
+    last_id = 0
+    while True:
+        rows = get_store().page_chunk_embeddings(last_id, page_size)
+        if not rows:
+            break
+        index.add([row["chunk_hash"] for row in rows], [row["chunk"] for row in rows],
+                  [row["embedding"] for row in rows])
+        last_id = rows[-1]["id"]
+    index.save()
+    sizes = index.nbytes()
+    print(f"Vector index built with {len(index)} chunks: {sizes['codes'] / 1e6:.1f} MB of {quantization} codes, "
+          f"{sizes['float32'] / 1e6:.1f} MB float32 sidecar.")
+    return index
+
+if __name__ == "__main__":
+    from config import VECTOR_INDEX_DIR
+
+    parser = argparse.ArgumentParser(description="Build the local quantized vector index from stored chunk embeddings.")
+    parser.add_argument("--dir", default=VECTOR_INDEX_DIR)
+    parser.add_argument("--quantization", choices=sorted(CODE_FILES), default="int8")
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+    build_vector_index(args.dir, args.quantization, args.page_size)